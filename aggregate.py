@@ -0,0 +1,179 @@
+import hashlib
+import heapq
+import io
+import math
+from collections import Counter
+
+from final_no_errors import scan_master_pattern
+
+# Streaming aggregators: each takes tokens one at a time through add(token_type, value),
+# keeps a bounded summary, and can merge() another of its kind, so statistics for a
+# whole corpus are built file by file (or process by process) without token lists.
+
+
+class TypeCounter:
+    # Number of tokens of each type
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, token_type, value):
+        self.counts[token_type] += 1
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    def result(self):
+        return dict(self.counts)
+
+
+class ValueCounter:
+    # Exact counts of the values of some token types, for small vocabularies such as
+    # keywords, operators or standard functions
+    def __init__(self, token_types):
+        self.token_types = frozenset(token_types)
+        self.counts = Counter()
+
+    def add(self, token_type, value):
+        if token_type in self.token_types:
+            self.counts[value] += 1
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    def result(self):
+        return dict(self.counts.most_common())
+
+
+class TopK:
+    # Most frequent values of some token types in bounded memory (Space-Saving). At most
+    # `capacity` values are counted; a new value takes over from the one with the
+    # smallest count, starting from that count, which it keeps as its error. A reported
+    # count is never below the true one and at most its error above it, and any value
+    # making up more than 1 / capacity of the counted tokens is always reported.
+    def __init__(self, k, token_types, capacity=None):
+        self.k = k
+        self.token_types = frozenset(token_types)
+        self.capacity = capacity or max(20 * k, 1000)
+        self.counts = {}
+        self.errors = {}
+        self.heap = []  # (count, value) for each counted value; a count here may be stale
+
+    def add(self, token_type, value):
+        if token_type in self.token_types:
+            counts = self.counts
+            if value in counts:
+                counts[value] += 1
+                return
+            error = self.evict() if len(counts) >= self.capacity else 0
+            counts[value] = error + 1
+            self.errors[value] = error
+            heapq.heappush(self.heap, (error + 1, value))
+
+    def evict(self):
+        # Stops counting the value with the smallest count and returns that count
+        heap = self.heap
+        counts = self.counts
+        while True:
+            count, value = heap[0]
+            if counts[value] == count:
+                heapq.heappop(heap)
+                del counts[value]
+                del self.errors[value]
+                return count
+            heapq.heapreplace(heap, (counts[value], value))  # Counted more since it was pushed
+
+    def floor(self):
+        # Most times a value that is not counted can have occurred
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other):
+        floor, other_floor = self.floor(), other.floor()
+        counts = {}
+        errors = {}
+        for value in self.counts.keys() | other.counts.keys():
+            counts[value] = self.counts.get(value, floor) + other.counts.get(value, other_floor)
+            errors[value] = self.errors.get(value, floor) + other.errors.get(value, other_floor)
+        kept = heapq.nlargest(self.capacity, counts, key=counts.get)
+        self.counts = {value: counts[value] for value in kept}
+        self.errors = {value: errors[value] for value in kept}
+        self.heap = [(count, value) for value, count in self.counts.items()]
+        heapq.heapify(self.heap)
+        return self
+
+    def result(self):
+        # Each entry is (value, count, error): the true count is between count - error and count
+        ranked = heapq.nlargest(self.k, self.counts.items(), key=lambda item: item[1])
+        return {'top': [(value, count, self.errors[value]) for value, count in ranked]}
+
+
+class DistinctCount:
+    # HyperLogLog estimate of the number of distinct values of some token types, in
+    # 2 ** precision bytes (about 1.6% error at the default). Values are hashed with
+    # BLAKE2b rather than hash(), which differs between processes.
+    def __init__(self, token_types, precision=12):
+        self.token_types = frozenset(token_types)
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, token_type, value):
+        if token_type in self.token_types:
+            digest = hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8)
+            hashed = int.from_bytes(digest.digest(), 'big')
+            bits = 64 - self.precision
+            register = hashed >> bits
+            rank = bits - (hashed & ((1 << bits) - 1)).bit_length() + 1  # Leading zeros + 1
+            if rank > self.registers[register]:
+                self.registers[register] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("cannot merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def result(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting is better for small sets
+        return round(estimate)
+
+
+def aggregate(lexer, aggregators):
+    # Feeds every token of lexer.code to the aggregators straight from the scanner,
+    # without building Token objects or a token list
+    adds = [aggregator.add for aggregator in aggregators]
+    if len(adds) == 1:
+        add = adds[0]
+
+        def emit(token_type, value, start, end):
+            add(token_type, value)
+    else:
+        def emit(token_type, value, start, end):
+            for add in adds:
+                add(token_type, value)
+    code = lexer.code
+    if not isinstance(code, str):  # Bytes or a memory map
+        code = lexer.code = str(code, 'utf-8', 'replace')
+    if code.isascii():
+        scan_master_pattern(lexer, code, emit=emit)
+    else:
+        # The state machine builds Token objects, but only a chunk's worth at a time
+        for token in lexer.iter_tokens(io.StringIO(code)):
+            emit(token.token_type, token.value, None, None)
+    return aggregators
+
+
+def merge_all(results):
+    # Merges lists of aggregators position by position, e.g. one list per file
+    merged = None
+    for aggregators in results:
+        if merged is None:
+            merged = aggregators
+        else:
+            for total, aggregator in zip(merged, aggregators):
+                total.merge(aggregator)
+    return merged
@@ -0,0 +1,150 @@
+import argparse
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from aggregate import DistinctCount, TopK, TypeCounter, aggregate, merge_all
+from final_no_errors import LEXERS, lexer_for_path
+from token_cache import TokenCache
+
+_caches = {}  # One TokenCache per directory in each worker process
+
+
+def report(error, errors=None):
+    # Unreadable files are skipped; errors collects them, or else they go to stderr
+    if errors is None:
+        sys.stderr.write('%s\n' % error)
+    else:
+        errors.append(error)
+
+
+def find_sources(root, errors=None):
+    # Every file under root that one of the lexers handles, in a stable order
+    for directory, subdirectories, files in os.walk(root, onerror=partial(report, errors=errors)):
+        subdirectories.sort()
+        for name in sorted(files):
+            if name.endswith(tuple(LEXERS)):
+                yield os.path.join(directory, name)
+
+
+def lex_file(file_path, engine='state', stats=False, cache=None):
+    # Runs in a worker process, so it returns plain tuples rather than Token objects,
+    # or (file_path, OSError) when the file cannot be read
+    try:
+        with open(file_path, 'r', errors='replace') as file:  # One bad byte must not stop a tree
+            code = file.read()
+    except OSError as error:  # Nor may a dangling symlink or an unreadable file
+        return file_path, error
+    lexer = lexer_for_path(file_path)(code, engine=engine)
+    if stats and cache is None:
+        counter, = aggregate(lexer, [TypeCounter()])  # No token list needed
+        return file_path, counter.counts
+    if cache is None:
+        tokens = lexer.tokenize()
+    else:
+        if cache not in _caches:
+            _caches[cache] = TokenCache(cache)
+        tokens = _caches[cache].tokenize_compact(lexer)
+    if stats:
+        return file_path, Counter(token.token_type for token in tokens)
+    return file_path, [(token.token_type, token.value) for token in tokens]
+
+
+def lex_tree(root, workers=None, chunksize=64, engine='state', stats=False, cache=None,
+             errors=None):
+    # Yields (path, tokens) or (path, Counter of token types) for every source file.
+    # The lexers share no state, so files are simply spread over a process pool;
+    # chunksize batches paths per task to keep inter-process overhead low.
+    # With a cache directory, unchanged files are not lexed again. Files that cannot
+    # be read are left out and reported (see report()).
+    worker = partial(lex_file, engine=engine, stats=stats, cache=cache)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_path, result in executor.map(worker, find_sources(root, errors),
+                                              chunksize=chunksize):
+            if isinstance(result, OSError):
+                report(result, errors)
+            else:
+                yield file_path, result
+
+
+def aggregate_file(file_path, factories):
+    try:
+        with open(file_path, 'r', errors='replace') as file:
+            code = file.read()
+    except OSError as error:
+        return error
+    return aggregate(lexer_for_path(file_path)(code), [factory() for factory in factories])
+
+
+def aggregate_tree(root, factories, workers=None, chunksize=64, errors=None):
+    # Runs fresh aggregators from factories (picklable callables, e.g. a class or a
+    # functools.partial) over every source file and merges them, so only one summary
+    # per aggregator is ever held in this process
+    def readable(results):
+        for result in results:
+            if isinstance(result, OSError):
+                report(result, errors)
+            else:
+                yield result
+
+    worker = partial(aggregate_file, factories=factories)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge_all(readable(executor.map(worker, find_sources(root, errors),
+                                               chunksize=chunksize)))
+
+
+def tree_statistics(root, workers=None, chunksize=64, engine='state', cache=None, errors=None):
+    files = 0
+    totals = Counter()
+    for file_path, counts in lex_tree(root, workers, chunksize, engine, True, cache, errors):
+        files += 1
+        totals.update(counts)
+    return files, totals
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Lex every C, C++ and Java file under a directory")
+    parser.add_argument('root')
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, default=64, help="files per task sent to a worker")
+    parser.add_argument('--engine', choices=['state', 'regex'], default='state')
+    parser.add_argument('--cache', metavar='DIRECTORY', help="reuse token streams of unchanged files")
+    parser.add_argument('--tokens', action='store_true', help="print every token instead of totals")
+    parser.add_argument('--top', type=int, metavar='K',
+                        help="also show the K most frequent identifiers and functions")
+    args = parser.parse_args()
+
+    errors = []
+    if args.tokens:
+        for file_path, tokens in lex_tree(args.root, args.workers, args.chunksize, args.engine,
+                                          cache=args.cache, errors=errors):
+            for token_type, value in tokens:
+                print('%s\t%s\t%s' % (file_path, token_type, value))
+    elif args.top:
+        names = ('Identifier', 'Standard Function', 'Class Name')
+        counts, identifiers, functions, distinct = aggregate_tree(
+            args.root, [TypeCounter, partial(TopK, args.top, {'Identifier'}),
+                        partial(TopK, args.top, names[1:]), partial(DistinctCount, names)],
+            args.workers, args.chunksize, errors) or [TypeCounter(), None, None, None]
+        print('%d tokens' % sum(counts.counts.values()))
+        for token_type, count in counts.counts.most_common():
+            print('%-20s %d' % (token_type, count))
+        if distinct:
+            print('\nabout %d distinct names' % distinct.result())
+            for title, top in (('identifiers', identifiers), ('functions and classes', functions)):
+                result = top.result()
+                print('\ntop %s:' % title)
+                for value, count, error in result['top']:
+                    over = ' (at most %d over)' % error if error else ''
+                    print('%-30s %d%s' % (value, count, over))
+    else:
+        files, totals = tree_statistics(args.root, args.workers, args.chunksize, args.engine,
+                                       args.cache, errors)
+        print('%d files, %d tokens' % (files, sum(totals.values())))
+        for token_type, count in totals.most_common():
+            print('%-20s %d' % (token_type, count))
+    for error in errors:
+        sys.stderr.write('%s: %s\n' % (parser.prog, error))
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from final_no_errors import CLexer, CppLexer, JavaLexer, LanguageTables
+
+SAMPLES = {
+    CLexer: 'pal.c',
+    JavaLexer: 'pal.java',
+    CppLexer: 'pal.cpp',
+}
+
+ENGINES = ('state', 'regex', 'compact')
+PROFILES = ('sample', 'identifiers', 'strings', 'operators', 'preprocessor')
+
+# Per-language pieces for the synthetic corpora
+STATEMENT_TYPES = {
+    CLexer: ['int', 'long', 'char', 'double', 'unsigned'],
+    JavaLexer: ['int', 'long', 'String', 'double', 'boolean'],
+    CppLexer: ['int', 'auto', 'std::string', 'double', 'bool'],
+}
+PRINT_CALLS = {
+    CLexer: 'printf("%s");',
+    JavaLexer: 'System.out.println("%s");',
+    CppLexer: 'std::cout << "%s" << std::endl;',
+}
+OPERATORS = ['+', '-', '*', '/', '%', '<<', '>>', '==', '!=', '<=', '>=', '&&', '||', '&', '|', '^']
+WORDS = ['alpha', 'beta', 'count', 'index', 'buffer', 'value', 'node', 'total', 'next', 'size']
+
+
+def load_corpus(sample, size):
+    # Repeat a sample file until the corpus reaches roughly `size` characters
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), sample)
+    with open(path, 'r') as file:
+        code = file.read()
+    return code * max(1, size // len(code))
+
+
+def identifier(rng):
+    return '_'.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) + str(rng.randint(0, 99))
+
+
+def synthetic_line(lexer_class, profile, rng):
+    if profile == 'identifiers':
+        return '%s %s = %s(%s, %s);' % (rng.choice(STATEMENT_TYPES[lexer_class]), identifier(rng),
+                                       identifier(rng), identifier(rng), identifier(rng))
+    if profile == 'strings':
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+        return PRINT_CALLS[lexer_class] % text
+    if profile == 'operators':
+        parts = [identifier(rng)]
+        for _ in range(rng.randint(4, 10)):
+            parts += [rng.choice(OPERATORS), str(rng.randint(0, 999)) if rng.random() < 0.3 else 'x']
+        return '%s = %s;' % (identifier(rng), ' '.join(parts))
+    if profile == 'preprocessor':
+        if lexer_class is JavaLexer:  # Java has no preprocessor; imports are the nearest thing
+            return 'import %s.%s.%s;' % (rng.choice(WORDS), rng.choice(WORDS), identifier(rng))
+        if rng.random() < 0.7:
+            return '#include <%s/%s.h>' % (rng.choice(WORDS), identifier(rng))
+        return synthetic_line(lexer_class, 'identifiers', rng)
+    raise ValueError("Unknown corpus profile: %s" % profile)
+
+
+def generate_corpus(lexer_class, profile, size, seed=0):
+    # The same arguments always give the same corpus, so runs can be compared
+    if profile == 'sample':
+        return load_corpus(SAMPLES[lexer_class], size)
+    rng = random.Random('%s-%s-%d' % (lexer_class.__name__, profile, seed))
+    lines = []
+    length = 0
+    while length < size:
+        line = '    ' * rng.randint(0, 3) + synthetic_line(lexer_class, profile, rng) + '\n'
+        lines.append(line)
+        length += len(line)
+    return ''.join(lines)
+
+
+def run_engine(lexer_class, code, engine):
+    lexer = lexer_class(code, engine='regex' if engine == 'compact' else engine)
+    return lexer.tokenize_compact() if engine == 'compact' else lexer.tokenize()
+
+
+def token_pairs(tokens):
+    return [(token.token_type, token.value) for token in tokens]
+
+
+def per_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def measure(lexer_class, profile, engine, code, repeat=3, expected=None):
+    # expected, if given, is the (type, value) pairs every engine must produce
+    best = None
+    same = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = run_engine(lexer_class, code, engine)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        count = len(tokens)
+        if same is None and expected is not None:
+            same = token_pairs(tokens) == expected  # Checked outside the timed part
+        del tokens
+    # Peak memory is measured in a separate run, since tracing slows lexing down
+    tracemalloc.start()
+    tokens = run_engine(lexer_class, code, engine)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del tokens
+    return {
+        'lexer': lexer_class.__name__,
+        'profile': profile,
+        'engine': engine,
+        'bytes': len(code),
+        'tokens': count,
+        'seconds': best,
+        'tokens_per_second': count / best,
+        'mb_per_second': len(code) / 1e6 / best,
+        'ns_per_char': best / len(code) * 1e9,
+        'peak_memory_bytes': peak,
+        'same_tokens': same,
+    }
+
+
+def construction_cost(lexer_class, repeat=20000):
+    # Construction with the shared tables against rebuilding them per instance
+    shared = per_call(lambda: lexer_class('x'), repeat)
+    rebuilt = per_call(lambda: LanguageTables(lexer_class), repeat)
+    return {'lexer': lexer_class.__name__, 'construct_us': shared * 1e6,
+            'rebuild_tables_us': (shared + rebuilt) * 1e6}
+
+
+def current_version():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_suite(size=200000, lexers=tuple(SAMPLES), profiles=PROFILES, engines=ENGINES,
+              repeat=3, seed=0, label=None):
+    results = []
+    for lexer_class in lexers:
+        for profile in profiles:
+            code = generate_corpus(lexer_class, profile, size, seed)
+            # Every engine must give the state machine's tokens
+            expected = token_pairs(run_engine(lexer_class, code, 'state'))
+            for engine in engines:
+                result = measure(lexer_class, profile, engine, code, repeat, expected)
+                results.append(result)
+                print('%-10s %-13s %-8s %8d tokens %6.2f MB/s %9.0f tokens/s %5.0f ns/char '
+                      '%7.1f MB peak  %s' % (
+                          result['lexer'], profile, engine, result['tokens'],
+                          result['mb_per_second'], result['tokens_per_second'],
+                          result['ns_per_char'], result['peak_memory_bytes'] / 1e6,
+                          'same tokens' if result['same_tokens'] else 'TOKENS DIFFER'))
+    construction = [construction_cost(lexer_class) for lexer_class in lexers]
+    for cost in construction:
+        print('%-10s construct %5.2f us (rebuilding tables %5.2f us)' % (
+            cost['lexer'], cost['construct_us'], cost['rebuild_tables_us']))
+    return {
+        'label': label or current_version(),
+        'python': platform.python_version(),
+        'size': size,
+        'seed': seed,
+        'results': results,
+        'construction': construction,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    # Throughput drops (and peak memory growth) beyond threshold, as readable lines
+    previous = {(r['lexer'], r['profile'], r['engine']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = (result['lexer'], result['profile'], result['engine'])
+        if result.get('same_tokens') is False:
+            regressions.append('%s %s %s: tokens differ from the state engine' % key)
+        if key not in previous:
+            continue
+        old = previous[key]
+        if result['tokens_per_second'] < old['tokens_per_second'] * (1 - threshold):
+            regressions.append('%s %s %s: %.0f -> %.0f tokens/s' % (
+                key + (old['tokens_per_second'], result['tokens_per_second'])))
+        if result['peak_memory_bytes'] > old['peak_memory_bytes'] * (1 + threshold):
+            regressions.append('%s %s %s: %.1f -> %.1f MB peak' % (
+                key + (old['peak_memory_bytes'] / 1e6, result['peak_memory_bytes'] / 1e6)))
+    return regressions
+
+
+if __name__ == '__main__':
+    lexers = {lexer_class.__name__: lexer_class for lexer_class in SAMPLES}
+    parser = argparse.ArgumentParser(description="Benchmark the C, Java and C++ lexers")
+    parser.add_argument('--size', type=int, default=200000, help="corpus size in characters")
+    parser.add_argument('--lexer', action='append', choices=sorted(lexers))
+    parser.add_argument('--profile', action='append', choices=PROFILES)
+    parser.add_argument('--engine', action='append', choices=ENGINES)
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs; the best is kept")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', help="name for this run (default: git revision)")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON results to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.1, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    suite = run_suite(args.size, [lexers[name] for name in args.lexer or sorted(lexers)],
+                      args.profile or PROFILES, args.engine or ENGINES, args.repeat, args.seed,
+                      args.label)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(suite, file, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            regressions = compare(json.load(file), suite, args.threshold)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        sys.exit(1 if regressions else 0)
+    sys.exit(0 if all(result['same_tokens'] for result in suite['results']) else 1)
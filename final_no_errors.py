@@ -1,4 +1,5 @@
-from tabulate import tabulate
+import sys
+from array import array
 
 # Token class for C, Java, and C++
 class Token:
@@ -6,320 +7,621 @@ class Token:
         self.token_type = token_type
         self.value = value
 
-# C Lexer
-class CLexer:
+# Compact token storage: small integer kind codes and (start, end) offsets into the
+# source in parallel typed arrays, about 9 bytes per token instead of a Token object
+# and a copied string. Values are only sliced out of the source when asked for.
+TOKEN_TYPES = (
+    'Keyword', 'Identifier', 'Standard Function', 'Class Name', 'Number',
+    'String', 'Operator', 'Symbol', 'Preprocessor', 'Header'
+)
+TOKEN_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+
+
+class TokenView:
+    # Stands in for a Token when reading from a TokenBuffer
+    __slots__ = ('buffer', 'index')
+
+    def __init__(self, buffer, index):
+        self.buffer = buffer
+        self.index = index
+
+    @property
+    def token_type(self):
+        return TOKEN_TYPES[self.buffer.kinds[self.index]]
+
+    @property
+    def value(self):
+        return self.buffer.value(self.index)
+
+
+class TokenBuffer:
     def __init__(self, code):
         self.code = code
-        self.tokens = []
-        self.keywords = self.get_keywords()  # C keywords
-        self.operators = self.get_operators()  # C operators
-        self.standard_functions = self.get_standard_functions()  # C Standard Functions
-        self.current_state = 'start'  # Initial state
-        self.current_token = ''  # Current token being constructed
+        offset_type = 'I' if len(code) < 2 ** 32 else 'Q'
+        self.kinds = array('B')
+        self.starts = array(offset_type)
+        self.ends = array(offset_type)
+        self.values = {}  # Values that are not a plain slice of the source, by index
 
-    def get_keywords(self):
-        return set([
-            'auto', 'break', 'case', 'char', 'const', 'continue', 'default',
-            'do', 'double', 'else', 'enum', 'extern', 'float', 'for', 'goto',
-            'if', 'inline', 'int', 'long', 'register', 'restrict', 'return',
-            'short', 'signed', 'sizeof', 'static', 'struct', 'switch',
-            'typedef', 'union', 'unsigned', 'void', 'volatile', 'while'
-        ])
-
-    def get_operators(self):
-        return set([
-            '==', '!=', '>=', '<=', '++', '--', '+=', '-=', '*=', '/=', '%=',
-            '&&', '||', '>', '<', '+', '-', '*', '/', '%', '=', '!', '&',
-            '|', '^', '<<', '>>', '~'
-        ])
-
-    def get_standard_functions(self):
-        return set([
-            'printf', 'scanf', 'malloc', 'free', 'exit', 'fopen', 'fclose',
-            'fgets', 'fputs', 'fprintf', 'fscanf', 'strcpy', 'strcat',
-            'strlen', 'strcmp', 'atoi', 'atof', 'abs', 'pow', 'sqrt'
-        ])
+    def add(self, token_type, value, start, end):
+        if end - start != len(value):
+            # Unknown characters were glued on
+            self.values[len(self.kinds)] = value if isinstance(value, str) else decode(value)
+        self.kinds.append(TOKEN_CODES[token_type])
+        self.starts.append(start)
+        self.ends.append(end)
 
-    def add_token(self, token_type):
-        if self.current_token:  # Only add if there's a current token
-            # Check if the token is a standard function
-            if token_type == 'Identifier' and self.current_token in self.standard_functions:
-                self.tokens.append(Token('Standard Function', self.current_token))
-            else:
-                self.tokens.append(Token(token_type, self.current_token))
-        self.current_token = ''  # Reset current token
+    def value(self, index):
+        if index in self.values:
+            return self.values[index]
+        value = self.code[self.starts[index]:self.ends[index]]
+        return value if isinstance(value, str) else decode(value)  # Memory-mapped source
 
-    def transition(self, char):
-        if self.current_state == 'start':
-            if char == '#':
-                self.current_state = 'preprocessor'
-                self.current_token = char
-            elif char.isalpha() or char == '_':
-                self.current_state = 'identifier'
-                self.current_token += char
-            elif char.isdigit():
-                self.current_state = 'number'
-                self.current_token += char
-            elif char in ('"', "'"):
-                self.current_state = 'string'
-                self.current_token += char
-            elif char in '(){};,.':
-                self.tokens.append(Token('Symbol', char))  # Add single character symbols
-            elif char in self.operators:
-                self.current_token = char  # Start building an operator
-                self.current_state = 'operator'
-            elif char.isspace():
-                pass  # Ignore whitespace
-            else:
-                self.current_token += char  # Any other character
+    def __len__(self):
+        return len(self.kinds)
 
-        elif self.current_state == 'preprocessor':
-            if char.isspace():
-                if self.current_token == '#include':
-                    self.add_token('Preprocessor')
-                    self.current_state = 'header'
-            else:
-                self.current_token += char  # Continue collecting the preprocessor keyword
-
-        elif self.current_state == 'header':
-            if char == '<':
-                self.current_token = char  # Start of a system header
-            elif char == '>':
-                self.current_token += char  # End of the header
-                self.add_token('Header')  # Add token as Header
-                self.current_state = 'start'
-            else:
-                self.current_token += char  # Collecting header name
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.kinds)
+        if not 0 <= index < len(self.kinds):
+            raise IndexError("token index out of range")
+        return TokenView(self, index)
 
-        elif self.current_state == 'identifier':
-            if char.isalnum() or char == '_':
-                self.current_token += char
-            else:
-                if self.current_token in self.keywords:
-                    self.add_token('Keyword')
-                else:
-                    self.add_token('Identifier')
-                self.current_state = 'start'
-                self.transition(char)  # Process the next character
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield TokenView(self, index)
 
-        elif self.current_state == 'number':
-            if char.isdigit() or char == '.':
-                self.current_token += char
-            else:
-                self.add_token('Number')
-                self.current_state = 'start'
-                self.transition(char)  # Process the next character
 
-        elif self.current_state == 'string':
-            self.current_token += char
-            if char == self.current_token[0]:  # End of string
-                self.add_token('String')
-                self.current_state = 'start'
+def map_file(file_path):
+    # Read-only memory map of a source file, to pass as code to a lexer so that
+    # tokenize_compact() scans it without reading or decoding it first. Values come
+    # from the bytes on disk, so '\r\n' is not translated as open(path, 'r') does.
+    import mmap
+    with open(file_path, 'rb') as file:
+        if not file.seek(0, 2):
+            return b''  # Empty files cannot be mapped
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
 
-        elif self.current_state == 'operator':
-            # Check if the operator can continue (like `==` or `+=`)
-            if self.current_token + char in self.operators:
-                self.current_token += char
-            else:
-                self.add_token('Operator')  # Finalize the operator
-                self.current_state = 'start'
-                self.transition(char)  # Process the next character
 
-    def tokenize(self):
-        for char in self.code:
-            self.transition(char)
-        # Add any remaining token after the loop
-        if self.current_token:
-            if self.current_state == 'identifier':
-                if self.current_token in self.keywords:
-                    self.add_token('Keyword')
+def state_machine_tokens(lexer, add, base=0):
+    # Lexes lexer.code with the state machine, handing each token to
+    # add(token_type, value, start, end) with its span moved along by base
+    tokens = lexer.tokens
+    lexer.tokens = []
+    lexer.spans = []
+    lexer.position = 0
+    lexer.feed(lexer.code)
+    lexer.flush()
+    for token, (start, end) in zip(lexer.tokens, lexer.spans):
+        add(token.token_type, token.value, start + base, end + base)
+    lexer.tokens = tokens
+    lexer.spans = None
+
+
+def lex_non_ascii(lexer, buffer, stop):
+    # Lexes bytes code from where the bytes scanner stopped (a NonAsciiInput) with the
+    # state machine, decoding as little as it can: up to the next ASCII whitespace,
+    # then ever longer stretches until the state machine is back in its start state
+    # with nothing carried over and no non-ASCII byte follows close behind. Tokens go
+    # into buffer with byte offsets. Returns the offset the bytes scanner can go on
+    # from, or None at the end of the input or once a directive has swallowed the rest.
+    code = buffer.code
+    space, non_ascii = byte_patterns()
+    tokens = lexer.tokens
+    lexer.tokens = []
+    lexer.spans = []
+    lexer.position = 0
+    lexer.current_state = 'start'
+    lexer.current_token = stop.pending.decode('ascii')
+    lexer.token_start = -1  # Unknown characters carried in start before the decoded text
+    pieces = []
+    position = reach = stop.start
+    step = 64
+    while True:
+        match = space.search(code, reach)
+        end = len(code) if match is None else match.end()
+        lexer.feed(str(code[position:end], 'utf-8', 'replace'))
+        pieces.append(decode_keeping_widths(code[position:end]))
+        position = end
+        if match is None:
+            lexer.flush()
+            position = None
+            break
+        if lexer.current_state == 'start' and not lexer.current_token and \
+                non_ascii.search(code, end, end + step) is None:
+            break
+        if lexer.current_state == 'preprocessor' and \
+                not '#include'.startswith(lexer.current_token):
+            position = None  # Nothing after a non-#include directive is ever emitted
+            break
+        reach = end + step
+        step *= 2
+
+    # Character offsets to byte offsets, walking text along with code
+    text = ''.join(pieces)
+    offset, at = 0, stop.start
+    add = buffer.add
+    for token, (start, end) in zip(lexer.tokens, lexer.spans):
+        if start >= offset:
+            at += len(text[offset:start].encode('utf-8'))
+            offset = start
+            first = at
+        elif start >= 0:  # Unknown characters from before the tokens in between
+            first = at - len(text[start:offset].encode('utf-8'))
+        else:
+            first = stop.pending_start
+        at += len(text[offset:end].encode('utf-8'))
+        offset = end
+        value = token.value
+        if start >= 0 and end - start == len(value):
+            value = code[first:at]  # A plain slice, so the buffer need not keep the value
+        add(token.token_type, value, first, at)
+    lexer.tokens = tokens
+    lexer.spans = None
+    lexer.current_state = 'start'
+    lexer.current_token = ''
+    return position
+
+
+def compact_tokenize(lexer):
+    # Offsets come from the master pattern scanner, or for input it cannot scan from
+    # the state machine. Bytes or memory-mapped code is scanned in place, with
+    # offsets in bytes, and only the stretches that need the str rules are decoded.
+    buffer = TokenBuffer(lexer.code)
+    if isinstance(lexer.code, str):
+        if lexer.code.isascii():
+            scan_master_pattern(lexer, lexer.code, emit=buffer.add)
+        else:
+            state_machine_tokens(lexer, buffer.add)
+        return buffer
+    position = 0
+    while position is not None:
+        try:
+            scan_master_pattern(lexer, lexer.code, emit=buffer.add, start=position)
+            break
+        except NonAsciiInput as stop:
+            position = lex_non_ascii(lexer, buffer, stop)
+    return buffer
+
+def tokenize_many(snippets, language):
+    # Lexes many short snippets with one lexer into one TokenBuffer over their joined
+    # text. Returns (buffer, offsets): the tokens of snippet i are buffer[offsets[i]]
+    # up to buffer[offsets[i + 1]], with starts and ends in the joined text.
+    if language not in LANGUAGES:
+        raise ValueError("Unsupported language: %s" % language)
+    snippets = list(snippets)
+    lexer = LANGUAGES[language]()  # One lexer and one identifier memo for every snippet
+    buffer = TokenBuffer(''.join(snippets))
+    code = buffer.code
+    add = buffer.add
+    identifier_types = {}
+    offsets = array(buffer.starts.typecode, [0])
+    base = 0
+    for snippet in snippets:
+        end = base + len(snippet)
+        if snippet.isascii():
+            # Scanned in place, so no snippet is copied and tokens cannot run into the next
+            scan_master_pattern(lexer, code, emit=add, start=base, end=end,
+                                identifier_types=identifier_types)
+        else:
+            lexer.reset(snippet)
+            state_machine_tokens(lexer, add, base)
+        lexer.reset()
+        offsets.append(len(buffer))
+        base = end
+    return buffer, offsets
+
+# Master pattern engine: each language's tables are compiled into one regex and
+# tokens are sliced out of the input instead of calling transition() per character.
+# It mirrors the state machine exactly, including how unknown characters prefix
+# the next token and how a non-#include directive swallows the rest of the input.
+WHITESPACE = ' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'  # ASCII characters where isspace() is true
+SYMBOLS = '(){};,.'
+
+
+def reachable_operators(operators):
+    # transition() only extends an operator while every prefix is itself an operator
+    reachable = [op for op in operators
+                 if all(op[:i] in operators for i in range(1, len(op)))]
+    return sorted(reachable, key=len, reverse=True)  # Longest match first
+
+
+_master_patterns = {}
+
+
+def build_master_pattern(operators, identifier_extra, preprocessor, binary=False):
+    # With binary, the pattern scans bytes and stops at the first non-ASCII byte
+    # outside a string, where the str rules (isalpha() and friends) would be needed
+    key = (operators, identifier_extra, preprocessor, binary)
+    if key not in _master_patterns:
+        import re  # Deferred so that importing the lexers and the CLI start up quickly
+        parts = [
+            ('identifier', '[A-Za-z_][A-Za-z0-9_' + re.escape(identifier_extra) + ']*'),
+            ('number', '[0-9][0-9.]*'),
+            ('string', '"[^"]*"?|\'[^\']*\'?'),  # Unterminated strings run to the end
+            ('symbol', '[' + re.escape(SYMBOLS) + ']'),
+            ('operator', '|'.join(re.escape(op) for op in reachable_operators(operators))),
+        ]
+        if preprocessor:
+            parts.append(('preprocessor', '#'))
+        if binary:
+            parts.append(('other', r'[^%s\x80-\xff]' % re.escape(WHITESPACE)))
+            parts.append(('nonascii', r'[\x80-\xff]'))
+        else:
+            parts.append(('other', '[^%s]' % re.escape(WHITESPACE)))
+        # Leading whitespace is skipped by the same match that finds the token
+        pattern = '[%s]*(?:%s)' % (
+            re.escape(WHITESPACE), '|'.join('(?P<%s>%s)' % part for part in parts))
+        _master_patterns[key] = re.compile(pattern.encode('ascii') if binary else pattern)
+    return _master_patterns[key]
+
+
+_include_patterns = {}
+
+
+def include_patterns(binary=False):
+    if binary not in _include_patterns:
+        import re
+        space = '[%s]' % re.escape(WHITESPACE)
+        patterns = [
+            # '#include' may be spread over whitespace; the directive ends at the next whitespace
+            '#' + ''.join(space + '*' + c for c in 'include') + space,
+            # Matches as much of that as is present, to tell "not yet" from "never"
+            '#' + ''.join('(?:' + space + '*' + c for c in 'include')
+            + ')?' * len('include') + space + '*',
+        ]
+        _include_patterns[binary] = [re.compile(pattern.encode('ascii') if binary else pattern)
+                                     for pattern in patterns]
+    return _include_patterns[binary]
+
+
+# A character that is as many bytes long in UTF-8 as its index
+WIDTH_CHARACTERS = ('', '?', '\x80', '\u0800', '\U00010000')
+
+
+def keep_width(error):
+    # Decoding error handler: like 'replace' it turns each run of invalid bytes into
+    # one character, but into one just as long in UTF-8 as the run
+    return WIDTH_CHARACTERS[error.end - error.start], error.end
+
+
+def decode_keeping_widths(data):
+    # Decodes data to as many characters as 'replace' does, each encoding back to as
+    # many bytes as it came from, to turn character offsets into byte offsets
+    import codecs
+    try:
+        codecs.lookup_error('lexer-keep-width')
+    except LookupError:
+        codecs.register_error('lexer-keep-width', keep_width)
+    return str(data, 'utf-8', 'lexer-keep-width')
+
+
+class NonAsciiInput(Exception):
+    # Raised by the bytes scanner at input only the str rules can lex: the state
+    # machine takes over at start in its start state, with the unknown characters in
+    # pending (from pending_start on) still waiting for the next token
+    def __init__(self, start, pending, pending_start):
+        super().__init__(start)
+        self.start = start
+        self.pending = pending
+        self.pending_start = pending_start
+
+
+_byte_patterns = []
+
+
+def byte_patterns():
+    # ASCII whitespace, which never occurs inside a multi-byte UTF-8 character, and
+    # non-ASCII bytes
+    if not _byte_patterns:
+        import re
+        _byte_patterns.append(re.compile(('[%s]' % re.escape(WHITESPACE)).encode('ascii')))
+        _byte_patterns.append(re.compile(b'[\x80-\xff]'))
+    return _byte_patterns
+
+
+def decode(value):
+    return value.decode('utf-8', 'replace')
+
+
+def finish_with(lexer, finish, value):
+    # Runs one of the lexer's own finishing methods on value and takes back the
+    # token type it chose, so both engines classify the same text the same way
+    tokens = lexer.tokens
+    lexer.tokens = []
+    lexer.current_token = value
+    finish()
+    token_type = lexer.tokens[0].token_type
+    lexer.tokens = tokens
+    return token_type
+
+
+def scan_master_pattern(lexer, code, final=True, emit=None, start=0, end=None,
+                        identifier_types=None):
+    # Scans code[start:end] in the lexer's start state, using current_token as
+    # the unknown characters carried in from earlier input. Unless final, it stops
+    # before any token that more input could still extend and returns where it stopped.
+    # Returns None once a non-#include directive has swallowed the rest of the input.
+    # Each token goes to emit(token_type, value, start, end); by default it is
+    # appended to lexer.tokens. A token's span is longer than its value when
+    # unknown characters from earlier in the input were glued onto it.
+    # code may also be bytes or a memory map, in which case values are bytes and
+    # NonAsciiInput is raised at a non-ASCII byte outside a string, at an identifier or
+    # number that a non-ASCII character may continue, or at a directive with non-ASCII
+    # input anywhere after it that would swallow the rest of the input.
+    # identifier_types may be shared between scans with the same lexer class.
+    binary = not isinstance(code, str)
+    text = decode if binary else str
+    if emit is None:
+        append = lexer.tokens.append
+
+        def emit(token_type, value, start, end):
+            append(Token(token_type, decode(value) if binary else value))
+    if end is None:
+        end = len(code)
+    master = build_master_pattern(frozenset(lexer.operators), lexer.identifier_extra,
+                                  lexer.preprocessor, binary)
+    match_next = master.scanner(code, start, end).match  # Continues where the last match ended
+    class_names = lexer.class_names
+    if identifier_types is None:
+        identifier_types = {}  # Identifier classification only depends on its text
+    pending = lexer.current_token  # Unknown characters waiting to prefix the next token
+    empty, include_text, header_open, header_close = '', '#include', '<', '>'
+    if binary:
+        class_names = frozenset(name.encode('utf-8') for name in class_names)
+        pending = pending.encode('utf-8')
+        empty, include_text, header_open, header_close = b'', b'#include', b'<', b'>'
+    pending_start = start
+    lexer.current_token = ''
+    while True:
+        match = match_next()
+        if match is None:
+            pos = end  # Only whitespace was left
+            break
+        kind = match.lastgroup
+        value = match.group(kind)
+        start = match.start(kind)
+        pos = match.end()
+        if kind == 'symbol':
+            emit('Symbol', value, start, pos)
+            continue
+        elif kind == 'other':
+            if not pending:
+                pending_start = start
+            pending += value
+            continue
+        elif kind == 'nonascii' or binary and pos < end and code[pos] > 0x7f and (
+                kind == 'identifier' or kind == 'number'):
+            raise NonAsciiInput(start, pending, pending_start)
+        elif pos == end and not final and kind != 'preprocessor' and (
+                kind != 'string' or pending or len(value) == 1 or value[-1] != value[0]):
+            pos = match.start()  # The next chunk may extend this token
+            break
+        elif kind == 'identifier':
+            if pending:
+                value = pending + value
+                start = pending_start
+                pending = empty
+            if pos == end:
+                lexer.current_state = 'identifier'
+                emit(finish_with(lexer, lexer.flush, text(value)), value, start, pos)
+                continue
+            token_type = identifier_types.get(value)
+            if token_type is None:
+                token_type = identifier_types[value] = finish_with(
+                    lexer, lexer.end_identifier, text(value))
+            emit(token_type, value, start, pos)
+            continue
+        elif kind == 'number':
+            kind = 'Number'
+        elif kind == 'string':
+            kind = 'String'
+            if pending:
+                # The string closes on the first character of the whole token
+                close = code.find(pending[:1], start + 1, end)
+                if close < 0:
+                    if not final:
+                        pos = match.start()
+                        break
+                    close = end - 1  # Unterminated strings run to the end
+                value = code[start:close + 1]
+                pos = close + 1
+                match_next = master.scanner(code, pos, end).match
+        elif kind == 'operator':
+            kind = 'Operator'
+            if pending:
+                if lexer.overwrite_prefix:
+                    pending = empty
                 else:
-                    self.add_token('Identifier')
-            elif self.current_state == 'number':
-                self.add_token('Number')
-            elif self.current_state == 'string':
-                self.add_token('String')
-            elif self.current_state == 'operator':
-                self.add_token('Operator')
+                    value = value[:1]  # A prefixed operator never continues
+                    pos = start + 1
+                    match_next = master.scanner(code, pos, end).match
+        else:  # preprocessor
+            if lexer.overwrite_prefix:
+                pending = empty
+            include_pattern, partial_include_pattern = include_patterns(binary)
+            include = None if pending else include_pattern.match(code, start, end)
+            close = code.find(header_close, include.end(), end) if include else -1
+            if not final and close < 0 and (
+                    include or partial_include_pattern.match(code, start, end).end() == end):
+                pos = match.start()  # Wait for the rest of the directive
+                break
+            if binary and (include is None or close < 0) and not code[start:end].isascii():
+                # Non-ASCII whitespace such as U+3000 also ends the directive; only
+                # the str rules can tell whether this input is really swallowed
+                raise NonAsciiInput(start, pending, pending_start)
+            if include is None:
+                lexer.current_state = 'preprocessor'
+                return None  # The state machine stays in 'preprocessor' until the end
+            emit(finish_with(lexer, lambda: lexer.add_token('Preprocessor'), '#include'),
+                 include_text, start, include.end() - 1)
+            if close < 0:
+                lexer.current_state = 'preprocessor'
+                return None  # Unterminated header is never emitted
+            header = code[include.end():close + 1]
+            if header_open in header:
+                header = header[header.rfind(header_open):]
+            pos = close + 1
+            emit(finish_with(lexer, lambda: lexer.add_token('Header'), text(header)),
+                 header, pos - len(header), pos)
+            match_next = master.scanner(code, pos, end).match
+            continue
 
-        return self.tokens
+        if pending:
+            value = pending + value
+            start = pending_start
+            pending = empty
+        emit('Class Name' if value in class_names else kind, value, start, pos)
+    lexer.current_token = text(pending)
+    lexer.current_state = 'start'
+    return pos
 
-# Java Lexer
-class JavaLexer:
-    def __init__(self, code):
-        self.code = code
-        self.tokens = []
-        self.keywords = self.get_keywords()  # Java keywords
-        self.operators = self.get_operators()  # Java operators
-        self.standard_functions = self.get_standard_functions()  # Java Standard Functions
-        self.class_names = self.get_class_names()  # Java Class Names
-        self.current_state = 'start'  # Initial state
-        self.current_token = ''  # Current token being constructed
 
-    def get_keywords(self):
-        return set([
-            'abstract', 'assert', 'boolean', 'break', 'byte', 'case', 'catch',
-            'char', 'class', 'const', 'continue', 'default', 'do', 'double',
-            'else', 'enum', 'extends', 'final', 'finally', 'float', 'for',
-            'if', 'implements', 'import', 'instanceof', 'int', 'interface',
-            'long', 'native', 'new', 'package', 'private', 'protected',
-            'public', 'return', 'short', 'static', 'strictfp', 'super',
-            'switch', 'synchronized', 'this', 'throw', 'throws', 'transient',
-            'try', 'void', 'volatile', 'while'
-        ])
-
-    def get_operators(self):
-        return set([
-            '==', '!=', '>=', '<=', '++', '--', '+=', '-=', '*=', '/=', '%=',
-            '&&', '||', '>', '<', '+', '-', '*', '/', '%', '=', '!', '&',
-            '|', '^', '<<', '>>', '~'
-        ])
-
-    def get_standard_functions(self):
-        return set([
-            'System.out.println', 'System.out.print', 'Math.abs', 'Math.max', 
-            'Math.min', 'Math.sqrt', 'Integer.parseInt', 'Double.parseDouble'
-        ])
-
-    def get_class_names(self):
-        return set(['String', 'Integer', 'Double', 'Math'])
+def stream_tokens(lexer, file, chunk_size):
+    # Generator behind iter_tokens(): lexer state carries across chunk boundaries
+    # and tokens are handed out as soon as they are complete.
+    buffer = ''
+    while True:
+        chunk = file.read(chunk_size)
+        final = not chunk
+        buffer += chunk
+        if lexer.engine == 'regex' and lexer.current_state == 'start' and buffer.isascii():
+            stop = scan_master_pattern(lexer, buffer, final)
+            if stop is None:
+                final = True  # Nothing after a non-#include directive is ever emitted
+            buffer = buffer[stop:] if stop is not None else ''
+            if len(buffer) > chunk_size:
+                # A token longer than a chunk would be scanned again from its start
+                # with every chunk; the state machine carries it along instead
+                lexer.feed(buffer)
+                buffer = ''
+        else:
+            lexer.feed(buffer)
+            buffer = ''
+            if final:
+                lexer.flush()
+        yield from lexer.tokens
+        lexer.tokens.clear()
+        if final or lexer.current_state == 'preprocessor' and \
+                not '#include'.startswith(lexer.current_token):
+            return  # Nothing after a non-#include directive is ever emitted
 
-    def add_token(self, token_type):
-        if self.current_token:  # Only add if there's a current token
-            # Check if the token is a class name
-            if self.current_token in self.class_names:
-                self.tokens.append(Token('Class Name', self.current_token))
-            # Check if the token is a standard function
-            elif token_type == 'Identifier' and self.current_token in self.standard_functions:
-                self.tokens.append(Token('Standard Function', self.current_token))
-            else:
-                self.tokens.append(Token(token_type, self.current_token))
-        self.current_token = ''  # Reset current token
+class CharacterTable(dict):
+    # Maps each character to classify(char), worked out the first time the character
+    # is seen. ASCII is filled in up front, so most lookups are one dict hit.
+    def __init__(self, classify):
+        super().__init__()
+        self.classify = classify
+        for code in range(128):
+            self[chr(code)] = classify(chr(code))
 
-    def transition(self, char):
-        if self.current_state == 'start':
-            if char.isalpha() or char == '_':
-                self.current_state = 'identifier'
-                self.current_token += char
+    def __missing__(self, char):
+        value = self[char] = self.classify(char)
+        return value
+
+
+# Language tables are built once per lexer class from its spec and shared by all its
+# instances, so constructing a lexer per file costs a few attribute lookups
+class LanguageTables:
+    def __init__(self, lexer_class):
+        self.keywords = frozenset(lexer_class.keywords)
+        self.operators = frozenset(lexer_class.operators)
+        self.standard_functions = frozenset(lexer_class.standard_functions)
+        self.class_names = frozenset(lexer_class.class_names)
+        # Characters that extend each operator prefix, replacing the
+        # `current_token + char in operators` string concatenation per character
+        operator_next = {}
+        for operator in self.operators:
+            for i in range(1, len(operator)):
+                operator_next.setdefault(operator[:i], set()).add(operator[i])
+        self.operator_next = {prefix: frozenset(chars) for prefix, chars in operator_next.items()}
+
+        operators = self.operators
+        preprocessor = lexer_class.preprocessor
+        identifier_extra = lexer_class.identifier_extra
+
+        def start_action(char):
+            # The checks the start state makes, in the order it makes them
+            if char == '#' and preprocessor:
+                return 'preprocessor'
+            elif char.isalpha() or char == '_':
+                return 'identifier'
             elif char.isdigit():
-                self.current_state = 'number'
-                self.current_token += char
+                return 'number'
             elif char in ('"', "'"):
-                self.current_state = 'string'
-                self.current_token += char
-            elif char in '(){};,.':
-                self.tokens.append(Token('Symbol', char))  # Add single character symbols
-            elif char in self.operators:
-                self.current_token += char  # Start building an operator
-                self.current_state = 'operator'
+                return 'string'
+            elif char in SYMBOLS:
+                return 'symbol'
+            elif char in operators:
+                return 'operator'
             elif char.isspace():
-                pass  # Ignore whitespace
-            else:
-                self.current_token += char  # Any other character
+                return 'space'
+            return 'other'  # Waits to prefix the next token
 
-        elif self.current_state == 'identifier':
-            if char == '.':
-                self.current_token += char
-            elif char.isalnum() or char == '_':
-                self.current_token += char
-            else:
-                if self.current_token in self.keywords:
-                    self.add_token('Keyword')
-                elif 'System.out' in self.current_token:  # Check for System.out calls
-                    self.add_token('Standard Function')  # Handle System.out specifically
-                else:
-                    self.add_token('Identifier')
-                self.current_state = 'start'
-                self.transition(char)  # Process the next character
+        self.start_actions = CharacterTable(start_action)
+        self.identifier_chars = CharacterTable(
+            lambda char: char.isalnum() or char == '_' or char in identifier_extra)
+        self.number_chars = CharacterTable(lambda char: char.isdigit() or char == '.')
 
-        elif self.current_state == 'number':
-            if char.isdigit() or char == '.':
-                self.current_token += char
-            else:
-                self.add_token('Number')
-                self.current_state = 'start'
-                self.transition(char)  # Process the next character
 
-        elif self.current_state == 'string':
-            self.current_token += char
-            if char == self.current_token[0]:  # End of string
-                self.add_token('String')
-                self.current_state = 'start'
+_language_tables = {}
 
-        elif self.current_state == 'operator':
-            # Check if the operator can continue (like `==` or `+=`)
-            if self.current_token + char in self.operators:
-                self.current_token += char
-            else:
-                self.add_token('Operator')  # Finalize the operator
-                self.current_state = 'start'
-                self.transition(char)  # Process the next character
 
-    def tokenize(self):
-        for char in self.code:
-            self.transition(char)
-        # Add any remaining token after the loop
-        if self.current_token:
-            if self.current_state == 'identifier':
-                if self.current_token in self.keywords:
-                    self.add_token('Keyword')
-                else:
-                    self.add_token('Identifier')
-            elif self.current_state == 'number':
-                self.add_token('Number')
-            elif self.current_state == 'string':
-                self.add_token('String')
-            elif self.current_state == 'operator':
-                self.add_token('Operator')
+def language_tables(lexer_class):
+    if lexer_class not in _language_tables:
+        _language_tables[lexer_class] = LanguageTables(lexer_class)
+    return _language_tables[lexer_class]
 
-        return self.tokens
 
-# C++ Lexer
-class CppLexer:
-    def __init__(self, code):
+# The lexer core shared by every language. A language is a subclass that only sets
+# the spec attributes below; the state machine, both engines, streaming and compact
+# storage all work from them.
+class Lexer:
+    language = None  # Name for --language
+    extensions = ()  # File extensions the lexer is picked for
+    keywords = frozenset()
+    operators = frozenset()
+    standard_functions = frozenset()
+    class_names = frozenset()
+    function_markers = ()  # Identifiers containing any of these are standard functions
+    identifier_extra = ''  # Characters allowed inside identifiers besides letters, digits and '_'
+    preprocessor = False  # '#include' lines are recognised
+    overwrite_prefix = False  # '#' and operators discard unknown characters seen before them
+
+    def __init__(self, code='', engine='state'):
         self.code = code
+        self.engine = engine  # 'state' (the state machine in feed()) or 'regex' (master pattern)
         self.tokens = []
-        self.keywords = self.get_keywords()  # C++ keywords
-        self.operators = self.get_operators()  # C++ operators
-        self.standard_functions = self.get_standard_functions()  # C++ Standard Functions
-        self.class_names = self.get_class_names()  # C++ Class Names
+        tables = language_tables(type(self))  # Shared by every lexer of this language
+        self.keywords = tables.keywords
+        self.operators = tables.operators
+        self.operator_next = tables.operator_next
+        self.standard_functions = tables.standard_functions
+        self.class_names = tables.class_names
+        self.start_actions = tables.start_actions
+        self.identifier_chars = tables.identifier_chars
+        self.number_chars = tables.number_chars
         self.current_state = 'start'  # Initial state
         self.current_token = ''  # Current token being constructed
+        self.position = 0  # Characters fed to the state machine so far
+        self.token_start = self.token_end = 0  # Span of the current token
+        self.spans = None  # Set to a list to collect (start, end) per token
+
+    @classmethod
+    def get_keywords(cls):
+        return set(cls.keywords)
+
+    @classmethod
+    def get_operators(cls):
+        return set(cls.operators)
+
+    @classmethod
+    def get_standard_functions(cls):
+        return set(cls.standard_functions)
 
-    def get_keywords(self):
-        return set([
-            'alignas', 'alignof', 'and', 'and_eq', 'asm', 'auto', 'bitand', 
-            'bitor', 'bool', 'break', 'case', 'catch', 'char', 'char8_t', 
-            'char16_t', 'char32_t', 'class', 'compl', 'concept', 'const', 
-            'constexpr', 'const_cast', 'continue', 'co_await', 'co_return', 
-            'decltype', 'default', 'delete', 'do', 'double', 'dynamic_cast', 
-            'else', 'enum', 'explicit', 'export', 'extern', 'false', 'float', 
-            'for', 'friend', 'goto', 'if', 'inline', 'int', 'long', 'mutable', 
-            'namespace', 'new', 'noexcept', 'not', 'not_eq', 'nullptr', 
-            'operator', 'or', 'or_eq', 'private', 'protected', 'public', 
-            'reflexpr', 'register', 'reinterpret_cast', 'requires', 'return', 
-            'short', 'signed', 'sizeof', 'static', 'static_assert', 'static_cast', 
-            'struct', 'switch', 'template', 'this', 'thread_local', 'throw', 
-            'true', 'try', 'typedef', 'typeid', 'typename', 'union', 
-            'unsigned', 'using', 'virtual', 'void', 'volatile', 'wchar_t', 
-            'while', 'xor', 'xor_eq'
-        ])
-
-    def get_operators(self):
-        return set([
-            '==', '!=', '>=', '<=', '++', '--', '+=', '-=', '*=', '/=', '%=',
-            '&&', '||', '>', '<', '+', '-', '*', '/', '%', '=', '!', '&',
-            '|', '^', '<<', '>>', '~', '->', '::'
-        ])
-
-    def get_standard_functions(self):
-        return set([
-            'std::cout', 'std::cin', 'std::endl', 'std::string', 'std::vector', 
-            'std::map', 'std::set', 'std::abs', 'std::pow', 'std::sqrt'
-        ])
-
-    def get_class_names(self):
-        return set(['std::string', 'std::vector', 'std::map', 'std::set'])
+    @classmethod
+    def get_class_names(cls):
+        return set(cls.class_names)
 
     def add_token(self, token_type):
         if self.current_token:  # Only add if there's a current token
@@ -331,98 +633,190 @@ class CppLexer:
                 self.tokens.append(Token('Standard Function', self.current_token))
             else:
                 self.tokens.append(Token(token_type, self.current_token))
+            if self.spans is not None:
+                self.spans.append((self.token_start, self.token_end))
         self.current_token = ''  # Reset current token
 
+    def end_identifier(self):
+        if self.current_token in self.keywords:
+            self.add_token('Keyword')
+        elif self.function_markers and any(marker in self.current_token
+                                           for marker in self.function_markers):
+            self.add_token('Standard Function')
+        else:
+            self.add_token('Identifier')
+
     def transition(self, char):
-        if self.current_state == 'start':
-            if char == '#':
-                self.current_state = 'preprocessor'
-                self.current_token += char
-            elif char.isalpha() or char == '_':
-                self.current_state = 'identifier'
-                self.current_token += char
-            elif char.isdigit():
-                self.current_state = 'number'
-                self.current_token += char
-            elif char in ('"', "'"):
-                self.current_state = 'string'
-                self.current_token += char
-            elif char in '(){};,.':
-                self.tokens.append(Token('Symbol', char))  # Add single character symbols
-            elif char in self.operators:
-                self.current_token += char  # Start building an operator
-                self.current_state = 'operator'
-            elif char.isspace():
-                pass  # Ignore whitespace
-            else:
-                self.current_token += char  # Any other character
-    
-        elif self.current_state == 'preprocessor':
-            if char.isspace():
-                if self.current_token == '#include':
-                    self.add_token('Preprocessor')  # Add as Preprocessor
-                    self.current_state = 'header'
-            else:
-                self.current_token += char  # Continue collecting the preprocessor keyword
-    
-        elif self.current_state == 'header':
-            if char == '<':
-                self.current_token = char  # Start of a system header
-            elif char == '>':
-                self.current_token += char  # End of the header
-                self.add_token('Header')  # Add token as Header
-                self.current_state = 'start'
-            else:
-                self.current_token += char  # Collecting header name
-    
-        elif self.current_state == 'identifier':
-            if char.isalnum() or char == '_' or char == ':':  # Support '::' in identifiers
-                self.current_token += char
-            else:
-                if self.current_token.startswith('std::'):  # Handle std:: namespace
-                    if self.current_token in self.standard_functions:
-                        self.add_token('Standard Function')
+        self.feed(char)
+
+    def feed(self, text):
+        # Runs the state machine over text exactly as calling transition() on each
+        # character would, but a run of characters that extends the current token is
+        # found first and added as one slice, so a long token is not rebuilt per character.
+        # Offsets count from the first character fed since reset(); with spans set to a
+        # list, (start, end) of each token is appended to it alongside self.tokens.
+        state = self.current_state
+        token = self.current_token
+        self.current_token = ''  # Leaves token the only reference, so += can grow it in place
+        token_start = self.token_start
+        base = self.position
+        tokens = self.tokens
+        spans = self.spans
+        start_actions = self.start_actions
+        operator_next = self.operator_next
+        i = 0
+        length = len(text)
+        while i < length:
+            char = text[i]
+            if state == 'start':
+                action = start_actions[char]
+                if action == 'space':
+                    i += 1  # Ignore whitespace
+                elif action == 'symbol':
+                    tokens.append(Token('Symbol', char))  # Add single character symbols
+                    if spans is not None:
+                        spans.append((base + i, base + i + 1))
+                    i += 1
+                elif action == 'other':
+                    j = i + 1  # Any other characters wait to prefix the next token
+                    while j < length and start_actions[text[j]] == 'other':
+                        j += 1
+                    if not token:
+                        token_start = base + i
+                    token += text[i:j]
+                    i = j
+                else:
+                    state = action
+                    if self.overwrite_prefix and (action == 'operator' or action == 'preprocessor'):
+                        token = char
+                        token_start = base + i
                     else:
-                        self.add_token('Identifier')  # Fallback if not a standard function
-                elif self.current_token in self.class_names:
-                    self.add_token('Class Name')
-                elif self.current_token in self.keywords:
-                    self.add_token('Keyword')
+                        if not token:
+                            token_start = base + i
+                        token += char
+                    i += 1
+
+            elif state == 'identifier' or state == 'number':
+                chars = self.identifier_chars if state == 'identifier' else self.number_chars
+                j = i
+                while j < length and chars[text[j]]:
+                    j += 1
+                token += text[i:j]
+                i = j
+                if i < length:  # text[i] ends the token and is processed again in 'start'
+                    self.current_token = token
+                    self.token_start = token_start
+                    self.token_end = base + i
+                    if state == 'identifier':
+                        self.end_identifier()
+                    else:
+                        self.add_token('Number')
+                    token = ''
+                    state = 'start'
+
+            elif state == 'operator':
+                # Check if the operator can continue (like `==` or `+=`)
+                if char in operator_next.get(token, ()):
+                    token += char
+                    i += 1
                 else:
-                    self.add_token('Identifier')
-                self.current_state = 'start'
-                self.transition(char)  # Process the next character
-    
-        elif self.current_state == 'number':
-            if char.isdigit() or char == '.':
-                self.current_token += char
-            else:
-                self.add_token('Number')
-                self.current_state = 'start'
-                self.transition(char)  # Process the next character
-    
-        elif self.current_state == 'string':
-            self.current_token += char
-            if char == self.current_token[0]:  # End of string
-                self.add_token('String')
-                self.current_state = 'start'
-    
-        elif self.current_state == 'operator':
-            # Check if the operator can continue (like `==` or `+=`)
-            if self.current_token + char in self.operators:
-                self.current_token += char
-            else:
-                self.add_token('Operator')  # Finalize the operator
-                self.current_state = 'start'
-                self.transition(char)  # Process the next character
+                    self.current_token = token
+                    self.token_start = token_start
+                    self.token_end = base + i
+                    self.add_token('Operator')  # Finalize the operator
+                    token = ''
+                    state = 'start'
+
+            elif state == 'string':
+                close = text.find(token[0], i)  # End of string
+                if close < 0:
+                    token += text[i:]
+                    i = length
+                else:
+                    token += text[i:close + 1]
+                    i = close + 1
+                    self.current_token = token
+                    self.token_start = token_start
+                    self.token_end = base + i
+                    self.add_token('String')
+                    token = ''
+                    state = 'start'
+
+            elif state == 'preprocessor':
+                if char.isspace():
+                    if token == '#include':
+                        self.current_token = token
+                        self.token_start = token_start
+                        self.token_end = base + i
+                        self.add_token('Preprocessor')
+                        token = ''
+                        state = 'header'
+                    i += 1
+                else:
+                    j = i + 1  # Continue collecting the preprocessor keyword
+                    while j < length and not text[j].isspace():
+                        j += 1
+                    token += text[i:j]
+                    i = j
 
+            elif state == 'header':
+                close = text.find('>', i)  # End of the header
+                stop = length if close < 0 else close
+                opening = text.rfind('<', i, stop)  # Start of a system header
+                if opening >= 0:
+                    token = text[opening:stop]
+                    token_start = base + opening
+                else:
+                    if not token:
+                        token_start = base + i
+                    token += text[i:stop]  # Collecting header name
+                i = stop
+                if close >= 0:
+                    token += '>'
+                    i += 1
+                    self.current_token = token
+                    self.token_start = token_start
+                    self.token_end = base + i
+                    self.add_token('Header')  # Add token as Header
+                    token = ''
+                    state = 'start'
+        self.current_state = state
+        self.current_token = token
+        self.token_start = token_start
+        self.position = base + length
 
     def tokenize(self):
-        for char in self.code:
-            self.transition(char)
+        if not isinstance(self.code, str):  # Bytes or a memory map
+            self.tokens = [Token(token.token_type, token.value)
+                           for token in compact_tokenize(self)]
+            return self.tokens
+        if self.engine == 'regex' and self.code.isascii():
+            scan_master_pattern(self, self.code)
+            return self.tokens
+        self.feed(self.code)
+        self.flush()
+        return self.tokens
+
+    def reset(self, code=''):
+        # Ready the lexer for new input, keeping its tables
+        self.code = code
+        self.tokens = []
+        self.current_state = 'start'
+        self.current_token = ''
+        self.position = 0
+
+    def tokenize_compact(self):
+        return compact_tokenize(self)
+
+    def iter_tokens(self, file, chunk_size=65536):
+        return stream_tokens(self, file, chunk_size)
+
+    def flush(self):
         # Add any remaining token after the loop
         if self.current_token:
+            self.token_end = self.position
             if self.current_state == 'identifier':
+                # Unlike end_identifier(), function markers are not checked here
                 if self.current_token in self.keywords:
                     self.add_token('Keyword')
                 else:
@@ -434,7 +828,100 @@ class CppLexer:
             elif self.current_state == 'operator':
                 self.add_token('Operator')
 
-        return self.tokens
+# C Lexer
+class CLexer(Lexer):
+    language = 'c'
+    extensions = ('.c',)
+    keywords = frozenset([
+        'auto', 'break', 'case', 'char', 'const', 'continue', 'default',
+        'do', 'double', 'else', 'enum', 'extern', 'float', 'for', 'goto',
+        'if', 'inline', 'int', 'long', 'register', 'restrict', 'return',
+        'short', 'signed', 'sizeof', 'static', 'struct', 'switch',
+        'typedef', 'union', 'unsigned', 'void', 'volatile', 'while'
+    ])
+    operators = frozenset([
+        '==', '!=', '>=', '<=', '++', '--', '+=', '-=', '*=', '/=', '%=',
+        '&&', '||', '>', '<', '+', '-', '*', '/', '%', '=', '!', '&',
+        '|', '^', '<<', '>>', '~'
+    ])
+    standard_functions = frozenset([
+        'printf', 'scanf', 'malloc', 'free', 'exit', 'fopen', 'fclose',
+        'fgets', 'fputs', 'fprintf', 'fscanf', 'strcpy', 'strcat',
+        'strlen', 'strcmp', 'atoi', 'atof', 'abs', 'pow', 'sqrt'
+    ])
+    preprocessor = True
+    overwrite_prefix = True
+
+# Java Lexer
+class JavaLexer(Lexer):
+    language = 'java'
+    extensions = ('.java',)
+    keywords = frozenset([
+        'abstract', 'assert', 'boolean', 'break', 'byte', 'case', 'catch',
+        'char', 'class', 'const', 'continue', 'default', 'do', 'double',
+        'else', 'enum', 'extends', 'final', 'finally', 'float', 'for',
+        'if', 'implements', 'import', 'instanceof', 'int', 'interface',
+        'long', 'native', 'new', 'package', 'private', 'protected',
+        'public', 'return', 'short', 'static', 'strictfp', 'super',
+        'switch', 'synchronized', 'this', 'throw', 'throws', 'transient',
+        'try', 'void', 'volatile', 'while'
+    ])
+    operators = CLexer.operators
+    standard_functions = frozenset([
+        'System.out.println', 'System.out.print', 'Math.abs', 'Math.max',
+        'Math.min', 'Math.sqrt', 'Integer.parseInt', 'Double.parseDouble'
+    ])
+    class_names = frozenset(['String', 'Integer', 'Double', 'Math'])
+    function_markers = ('System.out',)  # Any System.out call
+    identifier_extra = '.'  # Dotted names such as System.out.println
+
+# C++ Lexer
+class CppLexer(Lexer):
+    language = 'cpp'
+    extensions = ('.cpp',)
+    keywords = frozenset([
+        'alignas', 'alignof', 'and', 'and_eq', 'asm', 'auto', 'bitand',
+        'bitor', 'bool', 'break', 'case', 'catch', 'char', 'char8_t',
+        'char16_t', 'char32_t', 'class', 'compl', 'concept', 'const',
+        'constexpr', 'const_cast', 'continue', 'co_await', 'co_return',
+        'decltype', 'default', 'delete', 'do', 'double', 'dynamic_cast',
+        'else', 'enum', 'explicit', 'export', 'extern', 'false', 'float',
+        'for', 'friend', 'goto', 'if', 'inline', 'int', 'long', 'mutable',
+        'namespace', 'new', 'noexcept', 'not', 'not_eq', 'nullptr',
+        'operator', 'or', 'or_eq', 'private', 'protected', 'public',
+        'reflexpr', 'register', 'reinterpret_cast', 'requires', 'return',
+        'short', 'signed', 'sizeof', 'static', 'static_assert', 'static_cast',
+        'struct', 'switch', 'template', 'this', 'thread_local', 'throw',
+        'true', 'try', 'typedef', 'typeid', 'typename', 'union',
+        'unsigned', 'using', 'virtual', 'void', 'volatile', 'wchar_t',
+        'while', 'xor', 'xor_eq'
+    ])
+    operators = CLexer.operators | {'->', '::'}
+    standard_functions = frozenset([
+        'std::cout', 'std::cin', 'std::endl', 'std::string', 'std::vector',
+        'std::map', 'std::set', 'std::abs', 'std::pow', 'std::sqrt'
+    ])
+    class_names = frozenset(['std::string', 'std::vector', 'std::map', 'std::set'])
+    identifier_extra = ':'  # Support '::' in identifiers
+    preprocessor = True
+
+
+# Adding a language means writing its spec class and listing it here
+LEXER_CLASSES = (JavaLexer, CLexer, CppLexer)
+
+# Lexer for each supported file extension
+LEXERS = {extension: lexer_class
+          for lexer_class in LEXER_CLASSES for extension in lexer_class.extensions}
+
+for lexer_class in LEXER_CLASSES:
+    language_tables(lexer_class)  # Build the shared tables at import time
+
+
+def lexer_for_path(file_path):
+    for extension, lexer_class in LEXERS.items():
+        if file_path.endswith(extension):
+            return lexer_class
+    raise ValueError("Unsupported file type")
 
 
 def generate_token_table(tokens):
@@ -443,27 +930,96 @@ def generate_token_table(tokens):
         table.append([token.token_type, token.value])
     return table
 
-# Get file path input from the user
-file_path = input("Enter the path to your code file:\n")
-
-# Read the content of the file
-with open(file_path, 'r') as file:
-    code = file.read()
-
-# Determine the language based on the file extension
-if file_path.endswith(".java"):
-    lexer = JavaLexer(code)
-    tokens = lexer.tokenize()
-elif file_path.endswith(".c"):
-    lexer = CLexer(code)
-    tokens = lexer.tokenize()
-elif file_path.endswith(".cpp"):  # Add C++ lexer handling
-    lexer = CppLexer(code)
-    tokens = lexer.tokenize()
-else:
-    raise ValueError("Unsupported file type")
+# Lexer for each --language name
+LANGUAGES = {lexer_class.language: lexer_class for lexer_class in LEXER_CLASSES}
+
+OUTPUT_FORMATS = ('table', 'jsonl', 'csv', 'binary')  # Names of the writers in writers.py
+
+
+def expand_paths(paths):
+    # Paths may be globs (for shells that do not expand them); '-' means stdin
+    for path in paths:
+        if path != '-' and any(c in path for c in '*?['):
+            import glob
+            matches = sorted(glob.glob(path, recursive=True))
+            if not matches:
+                raise ValueError("No files match %s" % path)
+            yield from matches
+        else:
+            yield path
+
+
+def main(argv=None):
+    import argparse  # Only the command line needs these
+    parser = argparse.ArgumentParser(description="Tokenize C, C++ and Java source files")
+    parser.add_argument('paths', nargs='*',
+                        help="files or glob patterns; '-' or no paths reads stdin")
+    parser.add_argument('-l', '--language', choices=sorted(LANGUAGES),
+                        help="lexer to use instead of choosing by file extension")
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, default='jsonl',
+                        help="output format (default: jsonl); 'table' reads each file"
+                             " whole to lay out its grid")
+    parser.add_argument('--engine', choices=['state', 'regex'], default='regex')
+    parser.add_argument('--profile', action='store_true',
+                        help="write a JSON lexing profile per file to stderr")
+    args = parser.parse_args(argv)
+
+    paths = args.paths
+    if not paths:
+        if sys.stdin.isatty():
+            paths = [input("Enter the path to your code file:\n")]  # Interactive use
+        else:
+            paths = ['-']
+    try:
+        paths = list(expand_paths(paths))
+        lexer_classes = [LANGUAGES[args.language] if args.language else lexer_for_path(path)
+                         for path in paths]
+    except ValueError as error:
+        if '-' in paths and not args.language:
+            error = "--language is required when reading stdin"
+        parser.error(str(error))
+
+    from writers import WRITERS
+    write = WRITERS[args.format]
+    output = sys.stdout.buffer if args.format == 'binary' else sys.stdout
+    status = 0
+    header = True  # Until the first file is written
+    try:
+        for path, lexer_class in zip(paths, lexer_classes):
+            lexer = lexer_class(engine=args.engine)
+            if args.profile:
+                from profiling import LexerProfile
+                profile = LexerProfile(lexer)
+            try:
+                file = sys.stdin if path == '-' else open(path, 'r')
+            except OSError as error:
+                # Carry on with the other files, like cat does, but fail at the end
+                sys.stderr.write('%s: %s\n' % (parser.prog, error))
+                status = 1
+                continue
+            with file:
+                # The table needs every row to size its columns; the rest stream
+                if args.format == 'table':
+                    lexer.code = file.read()
+                    tokens = lexer.tokenize()
+                else:
+                    tokens = lexer.iter_tokens(file)
+                write(tokens, output, file_path=path if len(paths) > 1 else None,
+                      header=header)
+                header = False
+            if args.profile:
+                import json
+                report = dict(profile.report(), file=path)
+                sys.stderr.write(json.dumps(report) + '\n')
+        output.flush()
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`); stop quietly like other filters
+        import os
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    return status
 
-token_table = generate_token_table(tokens)
 
-# Print token table
-print(tabulate(token_table, headers=["Token Type", "Value"], tablefmt="grid"))
+if __name__ == '__main__':
+    sys.modules.setdefault('final_no_errors', sys.modules[__name__])  # Shared with writers.py
+    sys.exit(main())
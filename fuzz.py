@@ -0,0 +1,365 @@
+import argparse
+import gc
+import io
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from final_no_errors import (LEXER_CLASSES, SYMBOLS, TokenBuffer, compact_tokenize, map_file,
+                             state_machine_tokens, tokenize_many)
+from incremental import relex
+
+# Fuzzing and stress harness for the lexers. The differential part generates random
+# and adversarial inputs and checks every other way of lexing them against the state
+# machine's tokens and spans, shrinking any input that disagrees to a small reproduction.
+# The scaling part lexes adversarial inputs of doubling size and flags cases whose
+# time grows faster than linearly or that exceed the time or memory budgets. Cases
+# listed in KNOWN_CLIFFS are reported but do not fail the run, so that it can gate CI.
+
+UNKNOWN = ['@', '$', '`', '\\', '?', '[', ']', ':', '\x00', '\x7f']
+NON_ASCII = ['é', '²', '٣', 'λ', '\xa0', '\u3000', '\u2028', 'ß', '😀']
+WHITESPACE = [' ', '\n', '\t', '\r', '\x0b', '\x0c']
+DIRECTIVES = ['#include <stdio.h>', '#include "local.h"', '#include', '# include <a.h>',
+              '#define X 1', '#', '#include <', '>', '<', '#inc']
+STRINGS = ['"text"', "'c'", '"', "'", '"a\'b"', '"unterminated', '""', "''"]
+NUMBERS = ['0', '42', '3.14', '1..2', '7.', '123456789']
+IDENTIFIERS = ['x', 'value', '_tmp', 'a1', 'System.out.println', 'System.out.x', 'std::cout',
+               'std::foo', 'String', 'Math.max', 'a.b.c', 'x::y', 'include', 'printf']
+
+
+def fragment(lexer_class, rng):
+    roll = rng.random()
+    if roll < 0.15:
+        return rng.choice(sorted(lexer_class.keywords))
+    elif roll < 0.30:
+        return rng.choice(IDENTIFIERS + sorted(lexer_class.standard_functions)
+                          + sorted(lexer_class.class_names))
+    elif roll < 0.45:
+        return rng.choice(sorted(lexer_class.operators))
+    elif roll < 0.55:
+        return rng.choice(SYMBOLS)
+    elif roll < 0.62:
+        return rng.choice(STRINGS)
+    elif roll < 0.68:
+        return rng.choice(NUMBERS)
+    elif roll < 0.74:
+        return rng.choice(DIRECTIVES)
+    elif roll < 0.82:
+        return rng.choice(UNKNOWN)
+    elif roll < 0.86:
+        return rng.choice(NON_ASCII)
+    elif roll < 0.90:
+        return chr(rng.randint(0, 127))
+    return rng.choice(WHITESPACE)
+
+
+def random_input(lexer_class, rng, size):
+    parts = []
+    for _ in range(rng.randint(0, size)):
+        parts.append(fragment(lexer_class, rng))
+        if rng.random() < 0.6:
+            parts.append(rng.choice(WHITESPACE))
+    return ''.join(parts)
+
+
+def repeat_to(text, size):
+    return (text * (size // len(text) + 1))[:size]
+
+
+# Inputs aimed at the state machine's weak spots, each built to a requested size
+ADVERSARIAL = {
+    'operator-run': lambda size, rng: ''.join(rng.choice('+-*/<>=!&|^~%') for _ in range(size)),
+    'unterminated-string': lambda size, rng: '"' + 'x' * (size - 1),
+    'unknown-run': lambda size, rng: '@' * size,
+    'unknown-then-string': lambda size, rng: '@' * (size // 2) + '"' + 'x' * (size - size // 2),
+    'hash-run': lambda size, rng: '#' * size,
+    'include-run': lambda size, rng: repeat_to('#include <', size),
+    'long-identifier': lambda size, rng: 'a' * size,
+    'long-number': lambda size, rng: repeat_to('1.', size),
+    'quotes': lambda size, rng: repeat_to('"\'', size),
+    'symbol-run': lambda size, rng: ';' * size,
+    'program': lambda size, rng: repeat_to('int x = y + 1; printf("%d", x);\n', size),
+}
+
+
+def pairs(tokens):
+    return [(token.token_type, token.value) for token in tokens]
+
+
+def rows(buffer, offsets=None):
+    # (token type, value, start, end) per token; offsets maps the buffer's offsets to others
+    starts, ends = buffer.starts, buffer.ends
+    if offsets is not None:
+        starts, ends = [offsets[start] for start in starts], [offsets[end] for end in ends]
+    return [(token.token_type, token.value, starts[index], ends[index])
+            for index, token in enumerate(buffer)]
+
+
+def character_offsets(code):
+    # Character offset at each character boundary of code encoded as UTF-8
+    offsets = {}
+    position = 0
+    for index, char in enumerate(code):
+        offsets[position] = index
+        position += len(char.encode('utf-8'))
+    offsets[position] = len(code)
+    return offsets
+
+
+def reference(lexer_class, code):
+    buffer = TokenBuffer(code)
+    state_machine_tokens(lexer_class(code), buffer.add)
+    return rows(buffer)
+
+
+def lex_regex(lexer_class, code, rng):
+    return pairs(lexer_class(code, engine='regex').tokenize())
+
+
+def lex_compact(lexer_class, code, rng):
+    return rows(lexer_class(code).tokenize_compact())
+
+
+def lex_stream_state(lexer_class, code, rng):
+    return pairs(lexer_class(engine='state').iter_tokens(io.StringIO(code), rng.randint(1, 64)))
+
+
+def lex_stream_regex(lexer_class, code, rng):
+    return pairs(lexer_class(engine='regex').iter_tokens(io.StringIO(code), rng.randint(1, 64)))
+
+
+def compact_rows(buffer, code):
+    # Offsets into bytes or a memory map are in bytes
+    return rows(buffer, character_offsets(code))
+
+
+def lex_bytes(lexer_class, code, rng):
+    return compact_rows(lexer_class(code.encode('utf-8')).tokenize_compact(), code)
+
+
+def lex_mmap(lexer_class, code, rng):
+    fd, path = tempfile.mkstemp(suffix='.src')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(code.encode('utf-8'))
+        mapped = map_file(path)
+        try:
+            return compact_rows(lexer_class(mapped).tokenize_compact(), code)
+        finally:
+            if not isinstance(mapped, bytes):
+                mapped.close()
+    finally:
+        os.remove(path)
+
+
+def lex_many(lexer_class, code, rng):
+    # The snippet between two random neighbours must come out as if lexed alone
+    snippets = [random_input(lexer_class, rng, 5), code, random_input(lexer_class, rng, 5)]
+    buffer, offsets = tokenize_many(snippets, lexer_class.language)
+    base = len(snippets[0])
+    return [(buffer[index].token_type, buffer[index].value,
+             buffer.starts[index] - base, buffer.ends[index] - base)
+            for index in range(offsets[1], offsets[2])]
+
+
+def lex_incremental(lexer_class, code, rng):
+    # Start from a variant of code with one span replaced, then edit it back
+    offset = rng.randint(0, len(code))
+    inserted = code[offset:offset + rng.randint(0, 8)]
+    replaced = random_input(lexer_class, rng, 3)
+    old = code[:offset] + replaced + code[offset + len(inserted):]
+    buffer, first, removed, added = relex(lexer_class, compact_tokenize(lexer_class(old)),
+                                          offset, len(replaced), inserted)
+    return rows(buffer)
+
+
+MODES = {
+    'regex': lex_regex,
+    'compact': lex_compact,
+    'stream-state': lex_stream_state,
+    'stream-regex': lex_stream_regex,
+    'bytes': lex_bytes,
+    'mmap': lex_mmap,
+    'many': lex_many,
+    'incremental': lex_incremental,
+}
+
+SPAN_MODES = frozenset(['compact', 'bytes', 'mmap', 'many', 'incremental'])  # Spans checked too
+
+
+def disagrees(lexer_class, mode, code, seed):
+    # The mode's rng is reseeded so a failure reproduces while the input shrinks
+    expected = reference(lexer_class, code)
+    if mode not in SPAN_MODES:
+        expected = [row[:2] for row in expected]
+    try:
+        return MODES[mode](lexer_class, code, random.Random(seed)) != expected
+    except Exception:
+        return True
+
+
+def shrink(code, fails):
+    # Drops ever smaller chunks of code for as long as the failure persists
+    chunk = len(code) // 2
+    while chunk:
+        position = 0
+        while position < len(code):
+            candidate = code[:position] + code[position + chunk:]
+            if fails(candidate):
+                code = candidate
+            else:
+                position += chunk
+        chunk //= 2
+    return code
+
+
+def differential(lexer_classes, modes, iterations, seed, size=40):
+    rng = random.Random(seed)
+    failures = []
+    for lexer_class in lexer_classes:
+        for iteration in range(iterations):
+            if iteration % 10 == 9:
+                name = rng.choice(sorted(ADVERSARIAL))
+                code = ADVERSARIAL[name](rng.randint(1, 300), rng)
+            else:
+                code = random_input(lexer_class, rng, size)
+            for mode in modes:
+                mode_seed = rng.random()
+                if disagrees(lexer_class, mode, code, mode_seed):
+                    small = shrink(code, lambda candidate: disagrees(
+                        lexer_class, mode, candidate, mode_seed))
+                    failures.append((lexer_class.__name__, mode, small))
+                    print('MISMATCH %s %s: %r' % (lexer_class.__name__, mode, small))
+        print('%-10s %d inputs x %d modes checked' % (lexer_class.__name__, iterations, len(modes)))
+    return failures
+
+
+SCALING_MODES = {
+    'state': lambda lexer_class, code: lexer_class(code).tokenize(),
+    'regex': lambda lexer_class, code: lexer_class(code, engine='regex').tokenize(),
+    'compact': lambda lexer_class, code: lexer_class(code).tokenize_compact(),
+    'stream': lambda lexer_class, code: list(
+        lexer_class(engine='regex').iter_tokens(io.StringIO(code))),
+}
+
+
+# Scaling cases known to be flagged, as (lexer class name or None for any, generator,
+# mode) -> reason. They are still run and reported but do not fail the run, and one
+# that stops being flagged is pointed out so that it can be taken off the list.
+KNOWN_CLIFFS = {}
+
+
+def known_cliff(lexer_name, name, mode):
+    return KNOWN_CLIFFS.get((lexer_name, name, mode), KNOWN_CLIFFS.get((None, name, mode)))
+
+
+def best_time(function, repeat):
+    # Without garbage collection, as timeit does, so collections of the growing
+    # token list do not pass for a cliff
+    best = None
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        if enabled:
+            gc.enable()
+    return best
+
+
+def scaling(lexer_classes, modes, generators, min_size, max_size, time_budget, memory_budget,
+            max_slope, repeat, seed):
+    # time_budget is seconds per million characters and memory_budget bytes per
+    # character; a case stops growing as soon as it goes over the time budget
+    flagged = []
+    for lexer_class in lexer_classes:
+        for name in generators:
+            for mode in modes:
+                run = SCALING_MODES[mode]
+                timings = []
+                problems = []
+                size = min_size
+                while size <= max_size:
+                    code = ADVERSARIAL[name](size, random.Random(seed))
+                    elapsed = best_time(lambda: run(lexer_class, code), repeat)
+                    timings.append((size, elapsed))
+                    if elapsed > time_budget * size / 1e6:
+                        problems.append('%.2fs over the time budget at %d characters' % (
+                            elapsed, size))
+                        break
+                    size *= 2
+                # Growth exponent over the last two doublings (fewer if the case stopped
+                # early): about 1 for linear, 2 for quadratic
+                slope = 0.0
+                if len(timings) >= 2:
+                    (small, small_time), (large, large_time) = timings[-3:][0], timings[-1]
+                    slope = math.log(max(large_time, 1e-9) / max(small_time, 1e-9)) \
+                        / math.log(large / small)
+                    if slope > max_slope and large_time > 0.01:  # Shorter runs are noise
+                        problems.append('time grows as size^%.2f' % slope)
+                size, elapsed = timings[-1]
+                tracemalloc.start()
+                run(lexer_class, ADVERSARIAL[name](size, random.Random(seed)))
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                if peak > memory_budget * size:
+                    problems.append('%.0f bytes per character peak' % (peak / size))
+                known = known_cliff(lexer_class.__name__, name, mode)
+                if problems:
+                    note = '  %s: %s' % ('KNOWN' if known else 'FLAGGED', '; '.join(problems))
+                    flagged.append((lexer_class.__name__, name, mode, problems))
+                else:
+                    note = '  no longer flagged, see KNOWN_CLIFFS' if known else ''
+                print('%-10s %-20s %-8s %8d chars %7.2f us/char slope %5.2f %6.0f B/char%s' % (
+                    lexer_class.__name__, name, mode, size, elapsed / size * 1e6, slope,
+                    peak / size, note))
+    return flagged
+
+
+if __name__ == '__main__':
+    lexers = {lexer_class.__name__: lexer_class for lexer_class in LEXER_CLASSES}
+    parser = argparse.ArgumentParser(
+        description="Differential fuzzing and performance-cliff checks for the lexers")
+    parser.add_argument('--lexer', action='append', choices=sorted(lexers))
+    parser.add_argument('--mode', action='append', choices=sorted(MODES),
+                        help="lexing modes compared against the state machine (default: all)")
+    parser.add_argument('--iterations', type=int, default=500, help="inputs per lexer")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-differential', action='store_true')
+    parser.add_argument('--skip-scaling', action='store_true')
+    parser.add_argument('--generator', action='append', choices=sorted(ADVERSARIAL),
+                        help="adversarial inputs for the scaling checks (default: all)")
+    parser.add_argument('--scaling-mode', action='append', choices=sorted(SCALING_MODES))
+    parser.add_argument('--min-size', type=int, default=20000, help="first input size in characters")
+    parser.add_argument('--max-size', type=int, default=320000, help="largest input size in characters")
+    parser.add_argument('--time-budget', type=float, default=10.0,
+                        help="seconds allowed per million characters")
+    parser.add_argument('--memory-budget', type=float, default=1000.0,
+                        help="peak bytes allowed per input character")
+    parser.add_argument('--max-slope', type=float, default=1.5,
+                        help="largest allowed growth exponent of time against size")
+    parser.add_argument('--repeat', type=int, default=2, help="timed runs per size; the best is kept")
+    args = parser.parse_args()
+
+    lexer_classes = [lexers[name] for name in args.lexer or sorted(lexers)]
+    failures = flagged = []
+    if not args.skip_differential:
+        failures = differential(lexer_classes, args.mode or sorted(MODES), args.iterations,
+                                args.seed)
+    if not args.skip_scaling:
+        flagged = scaling(lexer_classes, args.scaling_mode or sorted(SCALING_MODES),
+                          args.generator or sorted(ADVERSARIAL), args.min_size, args.max_size,
+                          args.time_budget, args.memory_budget, args.max_slope, args.repeat,
+                          args.seed)
+    unexpected = [case for case in flagged if not known_cliff(*case[:3])]
+    print('%d mismatches, %d flagged scaling cases (%d known)' % (
+        len(failures), len(flagged), len(flagged) - len(unexpected)))
+    sys.exit(1 if failures or unexpected else 0)
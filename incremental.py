@@ -0,0 +1,193 @@
+import bisect
+from array import array
+from itertools import accumulate
+
+from final_no_errors import TOKEN_CODES, TokenBuffer, compact_tokenize, scan_master_pattern
+
+# After any other token the scanner is back in its start state with nothing carried
+# over. Unknown characters before a Symbol are still waiting for the next token, and
+# '#include' is always followed by its header.
+UNSAFE_KINDS = frozenset((TOKEN_CODES['Symbol'], TOKEN_CODES['Preprocessor']))
+
+
+# Tokens per block of ShiftedOffsets
+BLOCK_SIZE = 1024
+
+
+class ShiftedOffsets:
+    # Token offsets in blocks of up to BLOCK_SIZE, each with a shift that still has to
+    # be added to every offset in it. An edit moves all later offsets by changing one
+    # shift per block instead of one offset per token, and leaves the blocks themselves
+    # alone, so buffers before and after an edit share every block it did not touch.
+    def __init__(self, blocks, shifts):
+        self.blocks = blocks
+        self.shifts = shifts
+        self.firsts = [0]  # Index of the first offset in each block, then the length
+        self.firsts.extend(accumulate(map(len, blocks)))
+
+    @classmethod
+    def from_array(cls, offsets):
+        blocks = [offsets[index:index + BLOCK_SIZE]
+                  for index in range(0, len(offsets), BLOCK_SIZE)]
+        return cls(blocks, [0] * len(blocks))
+
+    def block(self, index):
+        # Block holding offset index, or the number of blocks for an index past the end
+        if index < len(self):
+            return bisect.bisect_right(self.firsts, index) - 1
+        return len(self.blocks)
+
+    def __len__(self):
+        return self.firsts[-1]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("offset index out of range")
+        block = self.block(index)
+        return self.blocks[block][index - self.firsts[block]] + self.shifts[block]
+
+    def __iter__(self):
+        for block, shift in zip(self.blocks, self.shifts):
+            yield from map(shift.__add__, block)
+
+    def bisect_left(self, value, lo=0):
+        # bisect.bisect_left() over the offsets, searching the last offset of each
+        # block first
+        blocks, shifts = self.blocks, self.shifts
+        low, high = self.block(lo), len(blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if blocks[middle][-1] + shifts[middle] < value:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(blocks):
+            return max(len(self), lo)
+        first = self.firsts[low]
+        return first + bisect.bisect_left(blocks[low], value - shifts[low], max(lo - first, 0))
+
+    def splice(self, first, resume, fresh, delta):
+        # Offsets [first, resume) replaced by the offsets in fresh, with delta added to
+        # the ones after. Only the blocks holding first and resume are rebuilt.
+        start, stop = self.block(first), self.block(resume)
+        middle = array(fresh.typecode)
+        if start < len(self.blocks):
+            middle.extend(map(self.shifts[start].__add__,
+                              self.blocks[start][:first - self.firsts[start]]))
+        middle.extend(fresh)
+        if stop < len(self.blocks):
+            middle.extend(map((self.shifts[stop] + delta).__add__,
+                              self.blocks[stop][resume - self.firsts[stop]:]))
+        pieces = [middle[index:index + BLOCK_SIZE] for index in range(0, len(middle), BLOCK_SIZE)]
+        shifts = [shift + delta for shift in self.shifts[stop + 1:]]
+        return ShiftedOffsets(self.blocks[:start] + pieces + self.blocks[stop + 1:],
+                              self.shifts[:start] + [0] * len(pieces) + shifts)
+
+
+class ShiftedValues:
+    # TokenBuffer.values of an edited buffer: the indexes of the tokens that have their
+    # own value, as ShiftedOffsets, and those values in the same order
+    def __init__(self, indexes, values):
+        self.indexes = indexes
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, values):
+        indexes = sorted(values)
+        return cls(ShiftedOffsets.from_array(array('Q', indexes)),
+                   [values[index] for index in indexes])
+
+    def position(self, index):
+        position = self.indexes.bisect_left(index)
+        if position < len(self.values) and self.indexes[position] == index:
+            return position
+        return -1
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, index):
+        return self.position(index) >= 0
+
+    def __getitem__(self, index):
+        position = self.position(index)
+        if position < 0:
+            raise KeyError(index)
+        return self.values[position]
+
+    def __iter__(self):
+        return iter(self.indexes)
+
+    def items(self):
+        return zip(self.indexes, self.values)
+
+    def splice(self, first, resume, fresh, shift):
+        # Values of tokens [first, resume) replaced by fresh ({index from first: value}),
+        # with shift added to the indexes of the tokens after
+        low, high = self.indexes.bisect_left(first), self.indexes.bisect_left(resume)
+        fresh_indexes = sorted(fresh)
+        return ShiftedValues(
+            self.indexes.splice(low, high, array('Q', (first + index for index in fresh_indexes)),
+                                shift),
+            self.values[:low] + [fresh[index] for index in fresh_indexes] + self.values[high:])
+
+
+class Resynchronised(Exception):
+    def __init__(self, old_index):
+        self.old_index = old_index  # First old token that is reused after the edit
+
+
+def relex(lexer_class, buffer, offset, deleted, inserted):
+    # Applies an edit (replace `deleted` characters at `offset` with `inserted`) to
+    # the source of a TokenBuffer from tokenize_compact() and re-lexes only from the
+    # last safe token before the edit until the new tokens line up with the old ones.
+    # Returns (new_buffer, first, removed, added): old tokens [first, first + removed)
+    # were replaced by new tokens [first, first + added). The new buffer's starts, ends
+    # and values are shifted lazily, so the cost follows the edit, not the file size.
+    old = buffer
+    code = old.code[:offset] + inserted + old.code[offset + deleted:]
+    lexer = lexer_class(code)
+    if not (code.isascii() and old.code.isascii()):
+        # Only the master pattern scanner can restart part way through the source
+        new = compact_tokenize(lexer)
+        return new, 0, len(old), len(new)
+
+    starts, ends = (offsets if isinstance(offsets, ShiftedOffsets)
+                    else ShiftedOffsets.from_array(offsets) for offsets in (old.starts, old.ends))
+    first = ends.bisect_left(offset)  # Tokens before it end before the edit
+    while first and old.kinds[first - 1] in UNSAFE_KINDS:
+        first -= 1
+    restart = ends[first - 1] if first else 0
+    edit_end = offset + len(inserted)
+    delta = len(inserted) - deleted
+    fresh = TokenBuffer(code)
+
+    def emit(token_type, value, start, end):
+        fresh.add(token_type, value, start, end)
+        if end >= edit_end and fresh.kinds[-1] not in UNSAFE_KINDS:
+            # Past the edit the text is unchanged, so if an old token ended at the
+            # same place with the same clean state, everything after it is unchanged
+            index = ends.bisect_left(end - delta, first)
+            if index < len(old) and ends[index] == end - delta \
+                    and old.kinds[index] not in UNSAFE_KINDS:
+                raise Resynchronised(index + 1)
+
+    try:
+        scan_master_pattern(lexer, code, emit=emit, start=restart)
+        resume = len(old)
+    except Resynchronised as resynchronised:
+        resume = resynchronised.old_index
+    added = len(fresh)
+    removed = resume - first
+
+    new = TokenBuffer(code)
+    new.kinds = old.kinds[:first] + fresh.kinds + old.kinds[resume:]
+    new.starts = starts.splice(first, resume, fresh.starts, delta)
+    new.ends = ends.splice(first, resume, fresh.ends, delta)
+    values = old.values
+    if not isinstance(values, ShiftedValues):
+        values = ShiftedValues.from_dict(values)
+    new.values = values.splice(first, resume, fresh.values, added - removed)
+    return new, first, removed, added
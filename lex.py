@@ -0,0 +1,8 @@
+import sys
+
+from final_no_errors import main
+
+# Command line entry point. Keeping it this small lets Python reuse the cached
+# bytecode of final_no_errors on every run instead of compiling the lexers again.
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import random
+import time
+from collections import Counter, defaultdict
+
+from final_no_errors import TOKEN_TYPES
+
+clock = time.perf_counter
+
+# States that hand the character ending their token back to 'start'
+REDISPATCHING = frozenset(['identifier', 'number', 'operator'])
+
+
+class TimedTokens(list):
+    # Stands in for lexer.tokens, timing the lexing that led up to each token
+    def __init__(self, profile, tokens=()):
+        super().__init__(tokens)
+        self.profile = profile
+
+    def append(self, token):
+        profile = self.profile
+        now = clock()
+        profile.token_counts[token.token_type] += 1
+        profile.token_seconds[token.token_type] += now - profile.last_token
+        profile.last_token = now
+        list.append(self, token)
+
+
+class CountingReader:
+    # Wraps the file given to iter_tokens() to count the characters it delivers
+    def __init__(self, file, profile):
+        self.file = file
+        self.profile = profile
+
+    def read(self, size=-1):
+        chunk = self.file.read(size)
+        self.profile.characters += len(chunk)
+        return chunk
+
+
+class LexerProfile:
+    # Instruments one lexer instance by replacing its methods with timed wrappers.
+    # Lexers that are not profiled run the class code untouched, so profiling costs
+    # nothing until it is switched on for a particular lexer.
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self.characters = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self.state_characters = Counter()  # Characters that arrived in each state
+        self.state_seconds = defaultdict(float)
+        self.redispatches = 0  # Characters that ended a token and were handed back to 'start'
+        self.token_counts = Counter()
+        self.token_seconds = defaultdict(float)  # Lexing time up to each token, by type
+        self.last_token = clock()
+        self.install()
+
+    def install(self):
+        lexer = self.lexer
+        feed = lexer.feed
+        tokenize = lexer.tokenize
+        tokenize_compact = lexer.tokenize_compact
+        iter_tokens = lexer.iter_tokens
+        lexer.tokens = TimedTokens(self, lexer.tokens)
+
+        def timed_feed(text):
+            # One character at a time, to see which state each one arrives in
+            for char in text:
+                state = lexer.current_state
+                count = len(lexer.tokens)
+                start = clock()
+                feed(char)
+                self.state_seconds[state] += clock() - start
+                self.state_characters[state] += 1
+                if state in REDISPATCHING and len(lexer.tokens) > count:
+                    self.redispatches += 1  # The character ended a token and went to 'start'
+
+        def timed_tokenize():
+            start = self.last_token = clock()
+            tokens = tokenize()
+            self.seconds += clock() - start
+            self.characters += len(lexer.code)
+            self.tokens += len(tokens)
+            if not isinstance(tokens, TimedTokens):  # Bytes input builds a fresh list
+                self.token_counts.update(token.token_type for token in tokens)
+            return tokens
+
+        def timed_tokenize_compact():
+            start = clock()
+            buffer = tokenize_compact()
+            self.seconds += clock() - start
+            self.characters += len(lexer.code)
+            self.tokens += len(buffer)
+            for kind, count in Counter(buffer.kinds).items():
+                self.token_counts[TOKEN_TYPES[kind]] += count
+            return buffer
+
+        def timed_iter_tokens(file, chunk_size=65536):
+            tokens = iter_tokens(CountingReader(file, self), chunk_size)
+            while True:
+                start = self.last_token = clock()
+                try:
+                    token = next(tokens)
+                except StopIteration:
+                    self.seconds += clock() - start
+                    return
+                self.seconds += clock() - start
+                self.tokens += 1
+                yield token
+
+        lexer.feed = timed_feed
+        lexer.tokenize = timed_tokenize
+        lexer.tokenize_compact = timed_tokenize_compact
+        lexer.iter_tokens = timed_iter_tokens
+
+    def report(self):
+        seconds = self.seconds or float('inf')
+        report = {
+            'lexer': type(self.lexer).__name__,
+            'engine': self.lexer.engine,
+            'characters': self.characters,
+            'tokens': self.tokens,
+            'seconds': self.seconds,
+            'characters_per_second': self.characters / seconds,
+            'tokens_per_second': self.tokens / seconds,
+            'redispatches': self.redispatches,
+            'states': {state: {'characters': count, 'seconds': self.state_seconds[state]}
+                       for state, count in self.state_characters.most_common()},
+            'token_types': {token_type: {'count': count,
+                                         'seconds': self.token_seconds.get(token_type, 0.0)}
+                            for token_type, count in self.token_counts.most_common()},
+        }
+        if self.characters and not self.state_characters:
+            # The master pattern scanner matches whole tokens, so there is nothing per state
+            report['states'] = report['redispatches'] = None
+            report['note'] = "states and redispatches are only recorded with --engine state"
+        return report
+
+
+def sampled(lexer, rate, chance=random.random):
+    # Profiles roughly `rate` of the lexers passed in; the rest run uninstrumented
+    return LexerProfile(lexer) if chance() < rate else None
@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from final_no_errors import LANGUAGES
+
+# Local HTTP service for the lexers, on TCP or a Unix socket:
+#   POST /tokenize?language=c   body is the source code, answer is
+#                               {"language": "c", "tokens": [[type, value], ...]}
+#   GET /stats                  request counts and latency percentiles
+# Small snippets are queued and lexed together, a batch at a time, on a helper thread;
+# whatever arrives while a batch is being lexed forms the next batch, so batches grow
+# with the load and a lone request waits for nothing. Large payloads go to a process
+# pool. When the queue or the pool is full, requests are turned away with 503.
+SMALL_PAYLOAD = 16384  # Characters; anything longer is lexed in the process pool
+BATCH_SIZE = 256  # Most snippets lexed in one go
+MAX_PENDING = 1024  # Snippets waiting for a batch before new ones are refused
+MAX_BODY = 16 * 1024 * 1024
+LATENCY_WINDOW = 10000  # Latencies kept for the percentiles
+
+REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 431: 'Request Header Fields Too Large',
+    503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def lex_snippet(language, code, engine='regex'):
+    # Runs in a worker, so it returns plain pairs rather than Token objects
+    lexer = LANGUAGES[language](code, engine=engine)
+    return [(token.token_type, token.value) for token in lexer.tokenize()]
+
+
+def lex_batch(snippets, engine='regex'):
+    return [lex_snippet(language, code, engine) for language, code in snippets]
+
+
+def percentile(ordered, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LexingService:
+    def __init__(self, workers=None, engine='regex', small_payload=SMALL_PAYLOAD,
+                 batch_size=BATCH_SIZE, max_pending=MAX_PENDING, max_body=MAX_BODY):
+        self.engine = engine
+        self.small_payload = small_payload
+        self.batch_size = batch_size
+        self.max_body = max_body
+        self.queue = asyncio.Queue(max_pending)  # (language, code, future) per snippet
+        self.batch_thread = ThreadPoolExecutor(1)
+        self.processes = ProcessPoolExecutor(workers)
+        self.max_large = (workers or os.cpu_count() or 1) * 2  # Running plus queued
+        self.large_in_flight = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batched = 0
+        self.batcher = None
+
+    async def start(self, host='127.0.0.1', port=8080, path=None):
+        loop = asyncio.get_running_loop()
+        # Start the worker processes before any thread exists, as forking a
+        # process that has threads can deadlock
+        await loop.run_in_executor(self.processes, int)
+        self.batcher = asyncio.create_task(self.run_batches())
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.cancel()
+        self.batch_thread.shutdown(cancel_futures=True)
+        self.processes.shutdown(cancel_futures=True)
+
+    async def run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            batch = [item for item in batch if not item[2].done()]  # Client went away
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(
+                    self.batch_thread, lex_batch, [item[:2] for item in batch], self.engine)
+            except Exception as error:
+                for item in batch:
+                    if not item[2].done():
+                        item[2].set_exception(error)
+                continue
+            self.batches += 1
+            self.batched += len(batch)
+            for item, tokens in zip(batch, results):
+                if not item[2].done():
+                    item[2].set_result(tokens)
+
+    async def tokenize(self, language, code):
+        loop = asyncio.get_running_loop()
+        if len(code) <= self.small_payload:
+            future = loop.create_future()
+            try:
+                self.queue.put_nowait((language, code, future))
+            except asyncio.QueueFull:
+                raise HTTPError(503, "too many pending requests")
+            return await future
+        if self.large_in_flight >= self.max_large:
+            raise HTTPError(503, "too many large requests")
+        self.large_in_flight += 1
+        try:
+            return await loop.run_in_executor(self.processes, lex_snippet, language, code,
+                                              self.engine)
+        finally:
+            self.large_in_flight -= 1
+
+    def stats(self):
+        ordered = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'pending': self.queue.qsize(),
+            'large_in_flight': self.large_in_flight,
+            'batches': self.batches,
+            'mean_batch_size': self.batched / self.batches if self.batches else 0.0,
+            'latency_ms': {name: percentile(ordered, fraction) * 1000 for name, fraction in
+                           (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))},
+        }
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/stats':
+            if method != 'GET':
+                raise HTTPError(405, "use GET")
+            return self.stats()
+        if url.path != '/tokenize':
+            raise HTTPError(404, "no such endpoint")
+        if method != 'POST':
+            raise HTTPError(405, "use POST")
+        language = parse_qs(url.query).get('language', [None])[0]
+        if language not in LANGUAGES:
+            raise HTTPError(400, "language must be one of: " + ', '.join(sorted(LANGUAGES)))
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            tokens = await self.tokenize(language, body.decode('utf-8', 'replace'))
+        except HTTPError:
+            self.rejected += 1
+            raise
+        self.latencies.append(time.perf_counter() - start)
+        return {'language': language, 'tokens': tokens}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return  # Client closed the connection
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, 431, {'error': "headers too large"}, False)
+                    return
+                try:
+                    request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                    method, target, version = request_line.split(' ', 2)
+                    headers = {}
+                    for line in header_lines:
+                        if line:
+                            name, value = line.split(':', 1)
+                            headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError("negative Content-Length")
+                except ValueError:
+                    await self.respond(writer, 400, {'error': "malformed request"}, False)
+                    return
+                if length > self.max_body:
+                    await self.respond(writer, 413, {'error': "body too large"}, False)
+                    return
+                body = await reader.readexactly(length)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection') != 'close'
+                try:
+                    status, payload = 200, await self.dispatch(method, target, body)
+                except HTTPError as error:
+                    status, payload = error.status, {'error': str(error)}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = ('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n'
+                'Connection: %s\r\n' % (status, REASONS[status], len(body),
+                                        'keep-alive' if keep_alive else 'close'))
+        if status == 503:
+            head += 'Retry-After: 1\r\n'
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()  # Slow readers hold up their own connection only
+
+
+async def serve(args):
+    service = LexingService(args.workers, args.engine, args.small_payload, args.batch_size,
+                            args.max_pending)
+    server = await service.start(args.host, args.port, args.unix)
+    where = args.unix or '%s:%d' % server.sockets[0].getsockname()[:2]
+    print('Lexing service listening on %s' % where, flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the C, Java and C++ lexers over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes for large payloads (default: CPU count)")
+    parser.add_argument('--engine', choices=['state', 'regex'], default='regex')
+    parser.add_argument('--small-payload', type=int, default=SMALL_PAYLOAD,
+                        help="largest request, in characters, that is batched")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING,
+                        help="queued snippets before requests are refused")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,47 @@
+import random
+from collections import Counter
+
+from aggregate import TopK
+
+
+def check_bounds(top, true_counts):
+    counted = sum(true_counts.values())
+    for value, count in top.counts.items():
+        assert count - top.errors[value] <= true_counts[value] <= count
+    for value, true_count in true_counts.items():
+        if true_count > counted / top.capacity:
+            assert value in top.counts
+
+
+def test_top_k_keeps_a_value_that_arrives_after_the_summary_fills():
+    top = TopK(2, {'I'}, capacity=2)
+    stream = ['a', 'b', 'c', 'd'] + ['x'] * 7
+    for value in stream:
+        top.add('I', value)
+    check_bounds(top, Counter(stream))
+    assert top.result()['top'][0][0] == 'x'
+
+
+def test_top_k_bounds_on_a_skewed_stream():
+    rng = random.Random(7)
+    stream = ['v%d' % int(rng.paretovariate(1.1)) for _ in range(20000)]
+    top = TopK(5, {'I'}, capacity=50)
+    for value in stream:
+        top.add('I', value)
+        top.add('Keyword', 'ignored')
+    true_counts = Counter(stream)
+    check_bounds(top, true_counts)
+    assert [value for value, count, error in top.result()['top']] == \
+        [value for value, count in true_counts.most_common(5)]
+
+
+def test_top_k_merge_keeps_the_bounds():
+    rng = random.Random(11)
+    parts = [['v%d' % int(rng.paretovariate(1.2)) for _ in range(5000)] for _ in range(4)]
+    merged = None
+    for part in parts:
+        top = TopK(3, {'I'}, capacity=30)
+        for value in part:
+            top.add('I', value)
+        merged = top if merged is None else merged.merge(top)
+    check_bounds(merged, Counter(value for part in parts for value in part))
@@ -0,0 +1,31 @@
+import os
+
+from batch import lex_tree, tree_statistics
+
+
+def write(path, code):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(code)
+
+
+def test_tree_skips_unreadable_files(tmp_path):
+    os.mkdir(tmp_path / 'sub')
+    write(tmp_path / 'a.c', 'int x;')
+    write(tmp_path / 'sub' / 'B.java', 'class B { }')
+    write(tmp_path / 'notes.txt', 'not source')
+    os.symlink('/nonexistent', tmp_path / 'dead.c')
+
+    errors = []
+    assert list(lex_tree(str(tmp_path), workers=1, errors=errors)) == [
+        (str(tmp_path / 'a.c'), [('Keyword', 'int'), ('Identifier', 'x'), ('Symbol', ';')]),
+        (str(tmp_path / 'sub' / 'B.java'), [('Keyword', 'class'), ('Identifier', 'B'),
+                                            ('Symbol', '{'), ('Symbol', '}')]),
+    ]
+    assert [type(error) for error in errors] == [FileNotFoundError]
+    assert errors[0].filename == str(tmp_path / 'dead.c')
+
+    errors = []
+    files, totals = tree_statistics(str(tmp_path), workers=1, errors=errors)
+    assert files == 2
+    assert totals == {'Keyword': 2, 'Identifier': 2, 'Symbol': 3}
+    assert len(errors) == 1
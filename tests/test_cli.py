@@ -0,0 +1,21 @@
+import os
+
+from final_no_errors import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_unreadable_paths_are_reported_and_the_rest_lexed(tmp_path, capsys):
+    missing = str(tmp_path / 'missing.c')
+    status = main([missing, str(tmp_path), os.path.join(ROOT, 'pal.c'), '-l', 'c', '-f', 'csv'])
+    out, err = capsys.readouterr()
+    assert status == 1
+    assert 'missing.c' in err and 'Is a directory' in err
+    assert out.splitlines()[0] == 'File,Token Type,Value'
+    assert out.splitlines()[1].endswith('pal.c,Preprocessor,#include')
+
+
+def test_default_format_is_jsonl(capsys):
+    assert main([os.path.join(ROOT, 'pal.c')]) == 0
+    out, err = capsys.readouterr()
+    assert out.splitlines()[0] == '{"type": "Preprocessor", "value": "#include"}'
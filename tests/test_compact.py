@@ -0,0 +1,79 @@
+import os
+
+from final_no_errors import CLexer, CppLexer, JavaLexer, TokenBuffer, state_machine_tokens
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def spans(buffer):
+    return [(token.token_type, token.value, buffer.starts[index], buffer.ends[index])
+            for index, token in enumerate(buffer)]
+
+
+def test_non_ascii_spans_come_from_the_state_machine():
+    # '@' is glued onto the next token across the space, so the token is not a slice
+    code = 'é @ x; int y; z = 1; // @x\n'
+    buffer = CLexer(code).tokenize_compact()
+    assert spans(buffer) == [
+        ('Identifier', 'é', 0, 1), ('Identifier', '@x', 2, 5), ('Symbol', ';', 5, 6),
+        ('Keyword', 'int', 7, 10), ('Identifier', 'y', 11, 12), ('Symbol', ';', 12, 13),
+        ('Identifier', 'z', 14, 15), ('Operator', '=', 16, 17), ('Number', '1', 18, 19),
+        ('Symbol', ';', 19, 20), ('Operator', '/', 21, 22), ('Operator', '/', 22, 23),
+        ('Identifier', '@x', 24, 26),
+    ]
+
+
+def test_directive_and_header_spans():
+    code = 'é\n# include  <stdio.h>\n'
+    assert spans(CLexer(code).tokenize_compact()) == [
+        ('Identifier', 'é', 0, 1), ('Preprocessor', '#include', 2, 11),
+        ('Header', '<stdio.h>', 13, 22),
+    ]
+
+
+def test_state_machine_spans_match_the_master_pattern():
+    for lexer_class, name in ((CLexer, 'pal.c'), (CppLexer, 'pal.cpp'), (JavaLexer, 'pal.java')):
+        with open(os.path.join(ROOT, name)) as file:
+            code = file.read() + '\n@ x #include <a.h> "open'
+        scanned = lexer_class(code).tokenize_compact()
+        buffer = TokenBuffer(code)
+        state_machine_tokens(lexer_class(code), buffer.add)
+        assert spans(buffer) == spans(scanned)
+
+
+def pairs(tokens):
+    return [(token.token_type, token.value) for token in tokens]
+
+
+def test_bytes_directive_with_non_ascii_whitespace():
+    for code in ('#include\u3000<stdio.h>\nint main(){}', '#inc\xa0lude <a.h> x',
+                 '# include\xa0<a.h>', '#include\u2028'):
+        for lexer_class in (CLexer, CppLexer):
+            assert pairs(lexer_class(code.encode('utf-8')).tokenize()) == \
+                pairs(lexer_class(code).tokenize())
+
+
+def test_bytes_with_invalid_utf8_are_decoded_leniently():
+    code = b'int caf\xe9 = 1;'
+    assert pairs(CLexer(code).tokenize()) == pairs(CLexer('int caf\ufffd = 1;').tokenize())
+
+
+def test_bytes_offsets_stay_in_bytes_around_non_ascii():
+    code = '// \xa9 2024\nint caf\xe9 = 1; @ \xb2x; "\u3000" y;\n'.encode('utf-8')
+    buffer = CLexer(code).tokenize_compact()
+    assert buffer.code is code
+    assert spans(buffer) == [
+        ('Operator', '/', 0, 1), ('Operator', '/', 1, 2), ('Number', '\xa92024', 3, 10),
+        ('Keyword', 'int', 11, 14), ('Identifier', 'caf\xe9', 15, 20), ('Operator', '=', 21, 22),
+        ('Number', '1', 23, 24), ('Symbol', ';', 24, 25), ('Number', '@\xb2', 26, 30),
+        ('Identifier', 'x', 30, 31), ('Symbol', ';', 31, 32), ('String', '"\u3000"', 33, 38),
+        ('Identifier', 'y', 39, 40), ('Symbol', ';', 40, 41),
+    ]
+    assert pairs(buffer) == pairs(CLexer(code.decode('utf-8')).tokenize())
+
+
+def test_bytes_offsets_with_invalid_utf8():
+    # Like U+FFFD, the two bytes that do not make a character wait to prefix the next token
+    buffer = JavaLexer(b'x \xe2\x82 ; y\xff z').tokenize_compact()
+    assert spans(buffer) == [('Identifier', 'x', 0, 1), ('Symbol', ';', 5, 6),
+                             ('Identifier', '\ufffdy', 2, 8), ('Identifier', '\ufffdz', 8, 11)]
@@ -0,0 +1,6 @@
+from final_no_errors import LEXER_CLASSES
+from fuzz import MODES, differential
+
+
+def test_every_mode_agrees_with_the_state_machine():
+    assert differential(LEXER_CLASSES, sorted(MODES), iterations=30, seed=0) == []
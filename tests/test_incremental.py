@@ -0,0 +1,84 @@
+import os
+import random
+
+import incremental
+from final_no_errors import CLexer, CppLexer, JavaLexer
+from incremental import relex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def spans(buffer):
+    return [(token.token_type, token.value, buffer.starts[index], buffer.ends[index])
+            for index, token in enumerate(buffer)]
+
+
+def check_edit(lexer_class, code, offset, deleted, inserted):
+    old = lexer_class(code).tokenize_compact()
+    new, first, removed, added = relex(lexer_class, old, offset, deleted, inserted)
+    edited = code[:offset] + inserted + code[offset + deleted:]
+    expected = spans(lexer_class(edited).tokenize_compact())
+    assert spans(new) == expected
+    # Only tokens [first, first + added) are new; the others are the old ones, moved along
+    delta = len(inserted) - deleted
+    before = spans(old)
+    assert expected[:first] == before[:first]
+    assert expected[first + added:] == [(token_type, value, start + delta, end + delta)
+                                        for token_type, value, start, end
+                                        in before[first + removed:]]
+    return first, removed, added
+
+
+def test_edit_inside_an_identifier():
+    code = 'int counter = 1; counter++;'
+    assert check_edit(CLexer, code, 6, 0, 'xx') == (1, 1, 1)
+    assert check_edit(CLexer, code, 4, 7, 'n') == (1, 1, 1)
+    check_edit(CLexer, code, 6, 0, ' ')  # Splits it in two
+
+
+def test_edit_inside_a_string():
+    code = 'printf("a b"); x = 1;'
+    check_edit(CLexer, code, 9, 1, 'c')
+    check_edit(CLexer, code, 7, 1, '')  # Drops the opening quote
+    check_edit(JavaLexer, 'String s = "one"; int y;', 13, 0, '"')  # Closes the string early
+
+
+def test_edit_inside_an_include():
+    code = '#include <stdio.h>\nint main() { return 0; }\n'
+    check_edit(CLexer, code, 10, 5, 'stdlib')
+    check_edit(CLexer, code, 3, 1, 'k')  # No longer #include, so the rest is swallowed
+    check_edit(CppLexer, code, 17, 1, '')  # Unterminated header
+    check_edit(CLexer, '#define X\nint y;', 2, 0, 'x')
+
+
+def test_edit_after_unknown_characters():
+    code = 'a[i] = b; @ x; $y;'
+    check_edit(CLexer, code, 3, 1, ') ')  # Right after the ']' glued onto '='
+    check_edit(CLexer, code, 12, 1, 'z')
+    check_edit(JavaLexer, code, 10, 0, '@')
+    check_edit(CppLexer, code, 15, 1, '')
+
+
+def test_edit_at_the_start_and_end():
+    code = 'int x = 1;\nreturn x;'
+    check_edit(CLexer, code, 0, 0, 'unsigned ')
+    check_edit(CLexer, code, 0, 3, '')
+    check_edit(CLexer, code, len(code), 0, ' y')
+    check_edit(CLexer, code, len(code) - 1, 1, '')
+    check_edit(CLexer, code, len(code), 0, '"open')
+    check_edit(CLexer, '', 0, 0, 'int x;')
+
+
+def test_many_edits_across_blocks(monkeypatch):
+    monkeypatch.setattr(incremental, 'BLOCK_SIZE', 4)  # Edits land in and across blocks
+    rng = random.Random(0)
+    with open(os.path.join(ROOT, 'pal.c')) as file:
+        code = file.read()
+    buffer = CLexer(code).tokenize_compact()
+    for _ in range(200):
+        offset = rng.randint(0, len(code))
+        deleted = rng.randint(0, 6)
+        inserted = rng.choice(['', 'x', ' ', ';', '"', 'a[1]', '@', '++', '#include <a.h>\n'])
+        buffer = relex(CLexer, buffer, offset, deleted, inserted)[0]
+        code = code[:offset] + inserted + code[offset + deleted:]
+        assert spans(buffer) == spans(CLexer(code).tokenize_compact())
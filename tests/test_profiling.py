@@ -0,0 +1,24 @@
+from final_no_errors import CLexer
+from profiling import LexerProfile
+
+CODE = 'int main() { return x + 1; }'
+
+
+def test_state_engine_profile_has_states():
+    lexer = CLexer(CODE, engine='state')
+    profile = LexerProfile(lexer)
+    lexer.tokenize()
+    report = profile.report()
+    assert sum(state['characters'] for state in report['states'].values()) == len(CODE)
+    assert report['redispatches'] == 6  # int main return x + 1 each end at the next character
+    assert 'note' not in report
+
+
+def test_regex_engine_profile_says_states_are_not_recorded():
+    lexer = CLexer(CODE, engine='regex')
+    profile = LexerProfile(lexer)
+    lexer.tokenize()
+    report = profile.report()
+    assert report['states'] is None and report['redispatches'] is None
+    assert '--engine state' in report['note']
+    assert report['token_types']['Keyword']['count'] == 2
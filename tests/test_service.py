@@ -0,0 +1,84 @@
+import asyncio
+import json
+import threading
+
+from service import LexingService
+
+
+async def request(port, method, target, body=b'', headers=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    lines = ['%s %s HTTP/1.1' % (method, target), 'Connection: close']
+    if headers is None:
+        headers = {'Content-Length': str(len(body))}
+    lines += ['%s: %s' % item for item in headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, payload = response.split(b'\r\n\r\n', 1)
+    return int(head.split(b' ', 2)[1]), json.loads(payload)
+
+
+def serve(scenario, **options):
+    async def main():
+        service = LexingService(workers=1, **options)
+        server = await service.start(port=0)
+        try:
+            return await scenario(service, server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+            service.close()
+    return asyncio.run(main())
+
+
+def test_tokenize():
+    async def scenario(service, port):
+        return await request(port, 'POST', '/tokenize?language=c', b'int x;')
+    status, payload = serve(scenario)
+    assert status == 200
+    assert payload == {'language': 'c', 'tokens': [['Keyword', 'int'], ['Identifier', 'x'],
+                                                   ['Symbol', ';']]}
+
+
+def test_bad_requests_get_400():
+    async def scenario(service, port):
+        return [
+            await request(port, 'POST', '/tokenize?language=c', headers={'Content-Length': '-5'}),
+            await request(port, 'POST', '/tokenize?language=c', headers={'Content-Length': 'x'}),
+            await request(port, 'POST', '/tokenize?language=cobol', b'x'),
+        ]
+    assert [status for status, payload in serve(scenario)] == [400, 400, 400]
+
+
+def test_large_body_gets_413():
+    async def scenario(service, port):
+        return await request(port, 'POST', '/tokenize?language=c', b'int x;' * 10)
+    status, payload = serve(scenario, max_body=16)
+    assert status == 413
+
+
+def test_full_queue_gets_503():
+    async def scenario(service, port):
+        gate = threading.Event()
+        service.batch_thread.submit(gate.wait)  # Holds up the batch thread
+        try:
+            first = asyncio.create_task(request(port, 'POST', '/tokenize?language=c', b'a;'))
+            while not service.requests or service.queue.qsize():
+                await asyncio.sleep(0.01)  # Until it is taken as a batch that waits for the thread
+            second = asyncio.create_task(request(port, 'POST', '/tokenize?language=c', b'b;'))
+            while not service.queue.qsize():
+                await asyncio.sleep(0.01)
+            third = await request(port, 'POST', '/tokenize?language=c', b'c;')
+        finally:
+            gate.set()
+        return [third[0], (await first)[0], (await second)[0], service.rejected]
+    assert serve(scenario, max_pending=1) == [503, 200, 200, 1]
+
+
+def test_too_many_large_requests_get_503():
+    async def scenario(service, port):
+        service.large_in_flight = service.max_large  # As if the pool were busy
+        status, payload = await request(port, 'POST', '/tokenize?language=java', b'int x;')
+        service.large_in_flight = 0
+        return status, (await request(port, 'POST', '/tokenize?language=java', b'int x;'))[0]
+    assert serve(scenario, small_payload=0) == (503, 200)
@@ -0,0 +1,33 @@
+import os
+
+from final_no_errors import CLexer
+from token_cache import RESCAN_FRACTION, TokenCache
+
+
+def directory_bytes(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory))
+
+
+def test_cache_size_limit_is_shared_between_caches(tmp_path):
+    max_bytes = 4000
+    caches = [TokenCache(str(tmp_path), max_bytes), TokenCache(str(tmp_path), max_bytes)]
+    largest = 0
+    for index in range(200):
+        cache = caches[index % 2]
+        lexer = CLexer('int x%d = %d; y = x%d * 2;' % (index, index, index))
+        cache.tokenize_compact(lexer)
+        largest = max(largest, os.path.getsize(os.path.join(cache.directory, cache.key(lexer))))
+        assert directory_bytes(tmp_path) <= \
+            max_bytes + len(caches) * (max_bytes // RESCAN_FRACTION + largest)
+    caches[0].evict()
+    assert directory_bytes(tmp_path) <= max_bytes
+
+
+def test_cache_hit_returns_the_same_tokens(tmp_path):
+    cache = TokenCache(str(tmp_path))
+    code = 'int café = 1; @ x;'
+    first = [(token.token_type, token.value) for token in cache.tokenize(CLexer(code))]
+    again = [(token.token_type, token.value) for token in cache.tokenize(CLexer(code))]
+    assert first == again == [(token.token_type, token.value)
+                              for token in CLexer(code).tokenize()]
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,76 @@
+import os
+import socket
+
+from token_index import TokenIndex, line_columns
+
+
+def write(path, code):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(code)
+
+
+def terms(index):
+    return {value for value, in index.connection.execute('SELECT value FROM terms')}
+
+
+def test_update_search_and_remove(tmp_path):
+    c_path = str(tmp_path / 'a.c')
+    java_path = str(tmp_path / 'B.java')
+    c_code = 'int café = 1; @ x;\nint total = café + total;\n'
+    write(c_path, c_code)
+    write(java_path, 'class B { int total; String name; }\n')
+    index = TokenIndex(str(tmp_path / 'index.db'))
+    try:
+        assert index.update(str(tmp_path), workers=1) == (2, 0, 0)
+        assert index.update(str(tmp_path), workers=1) == (0, 0, 2)
+
+        results = index.search('total')
+        assert [(path, token_type) for path, token_type, offsets in results] == \
+            [(java_path, 'Identifier'), (c_path, 'Identifier')]
+        offsets = results[1][2]
+        assert offsets == [c_code.index('total'), c_code.rindex('total')]  # After a non-ASCII name
+        assert line_columns(c_path, offsets) == [(2, 5), (2, 20)]
+        assert index.search('@x') == [(c_path, 'Identifier', [c_code.index('@')])]
+        assert index.search('name', 'Keyword') == []
+
+        write(c_path, 'int other;\n')
+        os.utime(c_path, ns=(1, 1))  # Changed even if the clock did not move
+        assert index.update(str(tmp_path), workers=1) == (1, 0, 1)
+        assert [path for path, token_type, offsets in index.search('total')] == [java_path]
+        assert 'café' not in terms(index)
+
+        os.remove(java_path)
+        assert index.update(str(tmp_path), workers=1) == (0, 1, 1)
+        assert index.search('total') == []
+        assert terms(index) == {'int', 'other'}
+        assert index.statistics()['files'] == 1
+    finally:
+        index.close()
+
+
+def test_update_skips_unreadable_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # Socket paths have to be short
+    write('a.c', 'int x;\n')
+    write('B.java', 'class B { }\n')
+    os.symlink('/nonexistent/dead.c', 'dead.c')  # os.stat() fails
+    server = socket.socket(socket.AF_UNIX)
+    server.bind('sock.c')  # os.stat() works, open() does not
+    index = TokenIndex('index.db')
+    try:
+        errors = []
+        assert index.update('.', workers=1, errors=errors) == (2, 0, 0)
+        assert sorted(error.filename for error in errors) == \
+            [str(tmp_path / 'dead.c'), str(tmp_path / 'sock.c')]
+        assert [path for path, token_type, offsets in index.search('x')] == \
+            [str(tmp_path / 'a.c')]
+
+        os.remove('a.c')
+        os.symlink('/nonexistent/a.c', 'a.c')  # An indexed file that can no longer be read
+        errors = []
+        assert index.update('.', workers=1, errors=errors) == (0, 1, 1)
+        assert len(errors) == 3
+        assert index.search('x') == []
+        assert terms(index) == {'class', 'B'}
+    finally:
+        index.close()
+        server.close()
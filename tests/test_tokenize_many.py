@@ -0,0 +1,50 @@
+import pytest
+
+from final_no_errors import LANGUAGES, tokenize_many
+
+
+def snippet_spans(buffer, offsets, index):
+    return [(buffer[token].token_type, buffer[token].value, buffer.starts[token],
+             buffer.ends[token]) for token in range(offsets[index], offsets[index + 1])]
+
+
+def alone(language, snippet, base):
+    buffer = LANGUAGES[language](snippet).tokenize_compact()
+    return [(token.token_type, token.value, buffer.starts[index] + base,
+             buffer.ends[index] + base) for index, token in enumerate(buffer)]
+
+
+def test_offsets_per_snippet():
+    buffer, offsets = tokenize_many(['int x;', '', 'y = 1;', ';'], 'c')
+    assert list(offsets) == [0, 3, 3, 7, 8]
+    assert buffer.code == 'int x;y = 1;;'
+    assert snippet_spans(buffer, offsets, 2) == [
+        ('Identifier', 'y', 6, 7), ('Operator', '=', 8, 9), ('Number', '1', 10, 11),
+        ('Symbol', ';', 11, 12)]
+
+
+def test_tokens_do_not_run_into_the_next_snippet():
+    snippets = ['int a', 'b = 1', '2', '"open', 'x"', '+', '=']
+    buffer, offsets = tokenize_many(snippets, 'c')
+    assert [token.value for token in buffer] == ['int', 'a', 'b', '=', '1', '2', '"open', 'x',
+                                                 '"', '+', '=']
+    assert list(offsets) == [0, 2, 5, 6, 7, 9, 10, 11]
+    # Lexed as one text, 'ab', '12', '"openx"' and '+=' would each be a single token
+    assert len(LANGUAGES['c'](''.join(snippets)).tokenize()) == 6
+
+
+def test_trailing_unknown_characters_are_dropped():
+    buffer, offsets = tokenize_many(['x @', 'y', 'a ]', '\xe9 $'], 'c')
+    assert [token.value for token in buffer] == ['x', 'y', 'a', '\xe9']
+    assert list(offsets) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize('language', sorted(LANGUAGES))
+def test_mixed_ascii_and_non_ascii_snippets(language):
+    snippets = ['int caf\xe9 = 1;', 'x = "\xfc" + y;', '@ \xb2', 'z;', '　#include <a.h>',
+                'String s;']
+    buffer, offsets = tokenize_many(snippets, language)
+    base = 0
+    for index, snippet in enumerate(snippets):
+        assert snippet_spans(buffer, offsets, index) == alone(language, snippet, base)
+        base += len(snippet)
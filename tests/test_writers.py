@@ -0,0 +1,46 @@
+import io
+import os
+
+from final_no_errors import CLexer, JavaLexer, main
+from writers import read_binary, read_binary_files, write_binary
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pairs(tokens):
+    return [(token.token_type, token.value) for token in tokens]
+
+
+def lex(lexer_class, name):
+    with open(os.path.join(ROOT, name)) as file:
+        return lexer_class(file.read()).tokenize()
+
+
+def test_binary_round_trip_of_one_file():
+    tokens = lex(CLexer, 'pal.c') + CLexer('"caf\xe9" x').tokenize()
+    output = io.BytesIO()
+    write_binary(tokens, output)
+    output.seek(0)
+    assert pairs(read_binary(output)) == pairs(tokens)
+
+
+def test_binary_round_trip_of_several_files():
+    c_tokens, java_tokens = lex(CLexer, 'pal.c'), lex(JavaLexer, 'pal.java')
+    output = io.BytesIO()
+    write_binary(c_tokens, output, file_path='pal.c')
+    write_binary([], output, file_path='empty.c', header=False)
+    write_binary(java_tokens, output, file_path='pal.java', header=False)
+    output.seek(0)
+    assert [(file_path, token.token_type, token.value)
+            for file_path, token in read_binary_files(output)] == \
+        [('pal.c',) + pair for pair in pairs(c_tokens)] + \
+        [('pal.java',) + pair for pair in pairs(java_tokens)]
+
+
+def test_cli_writes_one_binary_stream(capfdbinary):
+    paths = [os.path.join(ROOT, name) for name in ('pal.c', 'pal.java')]
+    assert main(paths + ['-f', 'binary']) == 0
+    out, err = capfdbinary.readouterr()
+    tokens = list(read_binary_files(io.BytesIO(out)))
+    assert len(tokens) == len(lex(CLexer, 'pal.c')) + len(lex(JavaLexer, 'pal.java'))
+    assert [file_path for file_path, token in tokens[::len(tokens) - 1]] == paths
@@ -0,0 +1,160 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from collections import OrderedDict
+
+from final_no_errors import Token, TokenBuffer, compact_tokenize
+
+# Bump when a lexer's behaviour changes without its tables changing
+CACHE_VERSION = 1
+
+# magic, token count, side value count, offset item size
+HEADER = struct.Struct('<4sIIB')
+MAGIC = b'LXC1'
+VALUE_HEADER = struct.Struct('<II')  # token index, encoded value length
+
+# Other processes may share a cache directory, so after writing this fraction of
+# max_bytes a cache scans it again before evicting
+RESCAN_FRACTION = 16
+
+_fingerprints = {}
+
+
+def lexer_fingerprint(lexer):
+    # Changes whenever the keyword/operator/function/class tables or scanning
+    # options of a lexer class change, so stale entries are simply never looked up
+    lexer_class = type(lexer)
+    if lexer_class not in _fingerprints:
+        digest = hashlib.sha256()
+        parts = [lexer_class.__name__, str(CACHE_VERSION), sys.byteorder,
+                 lexer_class.identifier_extra, str(lexer_class.preprocessor),
+                 str(lexer_class.overwrite_prefix), ' '.join(lexer_class.function_markers)]
+        for table in ('keywords', 'operators', 'standard_functions', 'class_names'):
+            parts.append(table + ':' + ' '.join(sorted(getattr(lexer, table, ()))))
+        digest.update('\n'.join(parts).encode('utf-8'))
+        _fingerprints[lexer_class] = digest.hexdigest()[:16]
+    return _fingerprints[lexer_class]
+
+
+def encode_buffer(buffer):
+    values = b''.join(
+        VALUE_HEADER.pack(index, len(encoded)) + encoded
+        for index, encoded in ((index, value.encode('utf-8', 'surrogatepass'))
+                               for index, value in sorted(buffer.values.items())))
+    return b''.join([
+        HEADER.pack(MAGIC, len(buffer.kinds), len(buffer.values), buffer.starts.itemsize),
+        buffer.kinds.tobytes(), buffer.starts.tobytes(), buffer.ends.tobytes(), values,
+    ])
+
+
+def decode_buffer(data, code):
+    magic, count, value_count, itemsize = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a token cache entry")
+    buffer = TokenBuffer(code)
+    if buffer.starts.itemsize != itemsize:
+        raise ValueError("token cache entry has a different offset size")
+    position = HEADER.size
+    buffer.kinds.frombytes(data[position:position + count])
+    position += count
+    for offsets in (buffer.starts, buffer.ends):
+        offsets.frombytes(data[position:position + count * itemsize])
+        position += count * itemsize
+    for _ in range(value_count):
+        index, length = VALUE_HEADER.unpack_from(data, position)
+        position += VALUE_HEADER.size
+        buffer.values[index] = data[position:position + length].decode('utf-8', 'surrogatepass')
+        position += length
+    return buffer
+
+
+class TokenCache:
+    # Token streams on disk, one file per (content, lexer) key, evicting the least
+    # recently used entries once the directory grows past max_bytes. With several
+    # processes writing, each can push it past by at most max_bytes / RESCAN_FRACTION
+    # (plus one entry) before it sees the others' entries.
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = None  # file name -> size, least recently used first
+        self.total_bytes = 0
+        self.written_bytes = 0  # Written by this cache since the directory was scanned
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def load_entries(self):
+        if self.entries is None:
+            found = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.tok') and entry.is_file():
+                    stat = entry.stat()
+                    found.append((stat.st_mtime, entry.name, stat.st_size))
+            self.entries = OrderedDict((name, size) for _, name, size in sorted(found))
+            self.total_bytes = sum(self.entries.values())
+            self.written_bytes = 0
+        return self.entries
+
+    def key(self, lexer):
+        digest = hashlib.sha256(lexer.code.encode('utf-8', 'surrogatepass')).hexdigest()
+        return '%s-%s.tok' % (digest, lexer_fingerprint(lexer))
+
+    def get(self, lexer):
+        name = self.key(lexer)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as file:
+                buffer = decode_buffer(file.read(), lexer.code)
+            os.utime(path)  # Recency survives across processes through the mtime
+        except (OSError, ValueError, struct.error):
+            self.misses += 1
+            return None
+        entries = self.load_entries()
+        if name in entries:
+            entries.move_to_end(name)
+        self.hits += 1
+        return buffer
+
+    def put(self, lexer, buffer):
+        name = self.key(lexer)
+        data = encode_buffer(buffer)
+        # Write then rename, so readers in other processes never see half an entry
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, os.path.join(self.directory, name))
+        entries = self.load_entries()
+        self.total_bytes += len(data) - entries.pop(name, 0)
+        entries[name] = len(data)
+        self.written_bytes += len(data)
+        if self.total_bytes > self.max_bytes or \
+                self.written_bytes * RESCAN_FRACTION > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Scans the directory again first, so what other processes have written or
+        # evicted since counts too
+        self.entries = None
+        entries = self.load_entries()
+        while self.total_bytes > self.max_bytes and len(entries) > 1:
+            name, size = entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass  # Another process evicted it first
+
+    def tokenize_compact(self, lexer):
+        buffer = self.get(lexer)
+        if buffer is None:
+            buffer = compact_tokenize(lexer)
+            self.put(lexer, buffer)
+        return buffer
+
+    def tokenize(self, lexer):
+        # Same result as lexer.tokenize(), without lexing on a cache hit
+        lexer.tokens = [Token(token.token_type, token.value)
+                        for token in self.tokenize_compact(lexer)]
+        return lexer.tokens
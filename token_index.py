@@ -0,0 +1,233 @@
+import argparse
+import bisect
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import find_sources, report
+from final_no_errors import TOKEN_CODES, TOKEN_TYPES, lexer_for_path
+from token_cache import lexer_fingerprint
+
+# Inverted index over lexed source trees in one SQLite file: for each (token type,
+# value) term, the files it occurs in and its character offsets in each file (as
+# read with open(path, 'r')). Offsets are stored as varint-encoded gaps, so a
+# posting costs one or two bytes per occurrence. Files are re-lexed only when their
+# size, modification time or lexer tables change.
+INDEXED_TYPES = frozenset(token_type for token_type in TOKEN_TYPES
+                          if token_type not in ('Symbol', 'Operator'))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, fingerprint TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY, kind INTEGER NOT NULL, value TEXT NOT NULL,
+    UNIQUE (value, kind));
+CREATE TABLE IF NOT EXISTS postings (
+    term INTEGER NOT NULL, file INTEGER NOT NULL, offsets BLOB NOT NULL,
+    PRIMARY KEY (term, file)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_file ON postings (file);
+'''
+
+
+def encode_offsets(offsets):
+    # Gaps between ascending offsets, 7 bits per byte with a continuation bit
+    encoded = bytearray()
+    previous = 0
+    for offset in offsets:
+        gap = offset - previous
+        previous = offset
+        while gap >= 0x80:
+            encoded.append(gap & 0x7f | 0x80)
+            gap >>= 7
+        encoded.append(gap)
+    return bytes(encoded)
+
+
+def decode_offsets(encoded):
+    offsets = []
+    offset = gap = shift = 0
+    for byte in encoded:
+        gap |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            offset += gap
+            offsets.append(offset)
+            gap = shift = 0
+    return offsets
+
+
+def index_file(file_path, token_types=INDEXED_TYPES):
+    # Runs in a worker process: returns the file's postings as {(kind, value): offsets},
+    # or (file_path, OSError) when the file cannot be read
+    try:
+        with open(file_path, 'r', errors='replace') as file:
+            code = file.read()
+    except OSError as error:
+        return file_path, error
+    lexer = lexer_for_path(file_path)(code)
+    buffer = lexer.tokenize_compact()
+    kinds = frozenset(TOKEN_CODES[token_type] for token_type in token_types)
+    postings = {}
+    for index, kind in enumerate(buffer.kinds):
+        if kind in kinds:
+            term = (kind, buffer.value(index))
+            if term in postings:
+                postings[term].append(buffer.starts[index])
+            else:
+                postings[term] = [buffer.starts[index]]
+    return file_path, {term: encode_offsets(offsets) for term, offsets in postings.items()}
+
+
+class TokenIndex:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.term_ids = None  # (kind, value) -> term id, loaded when first updating
+
+    def close(self):
+        self.connection.close()
+
+    def term_id(self, kind, value):
+        if self.term_ids is None:
+            self.term_ids = {(kind, value): term for term, kind, value
+                             in self.connection.execute('SELECT id, kind, value FROM terms')}
+        term = self.term_ids.get((kind, value))
+        if term is None:
+            term = self.connection.execute('INSERT INTO terms (kind, value) VALUES (?, ?)',
+                                           (kind, value)).lastrowid
+            self.term_ids[kind, value] = term
+        return term
+
+    def remove_file(self, file_id):
+        self.connection.execute('DELETE FROM postings WHERE file = ?', (file_id,))
+        self.connection.execute('DELETE FROM files WHERE id = ?', (file_id,))
+
+    def update(self, root, workers=None, chunksize=16, errors=None):
+        # Brings the index up to date with the source files under root. Returns
+        # (indexed, removed, unchanged) file counts. Files that cannot be read are
+        # reported (see batch.report()) and left out of the index.
+        root = os.path.abspath(root)
+        known = {path: (file_id, mtime_ns, size, fingerprint)
+                 for file_id, path, mtime_ns, size, fingerprint in self.connection.execute(
+                     'SELECT id, path, mtime_ns, size, fingerprint FROM files')
+                 if path == root or path.startswith(os.path.join(root, ''))}
+        changed = {}
+        unchanged = 0
+        for path in find_sources(root, errors):
+            try:
+                stat = os.stat(path)
+            except OSError as error:  # A dangling symlink, say; dropped if it was indexed
+                report(error, errors)
+                continue
+            fingerprint = lexer_fingerprint(lexer_for_path(path)())
+            current = (stat.st_mtime_ns, stat.st_size, fingerprint)
+            if path in known and known[path][1:] == current:
+                del known[path]
+                unchanged += 1
+            else:
+                changed[path] = current
+        indexed = 0
+        with self.connection:  # One transaction for the whole update
+            if changed:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    for path, postings in executor.map(index_file, changed,
+                                                       chunksize=chunksize):
+                        if isinstance(postings, OSError):
+                            report(postings, errors)  # Its old postings go with the rest
+                        else:
+                            known.pop(path, None)
+                            self.add_file(path, changed[path], postings)
+                            indexed += 1
+            for path in known:  # Deleted or unreadable since the last update
+                self.remove_file(known[path][0])
+            if known or changed:
+                self.prune_terms()
+        return indexed, len(known), unchanged
+
+    def prune_terms(self):
+        # Drops terms left without postings by removed or re-indexed files
+        self.connection.execute('DELETE FROM terms WHERE NOT EXISTS'
+                                ' (SELECT 1 FROM postings WHERE postings.term = terms.id)')
+        self.term_ids = None
+
+    def add_file(self, path, state, postings):
+        row = self.connection.execute('SELECT id FROM files WHERE path = ?', (path,)).fetchone()
+        if row is not None:
+            self.remove_file(row[0])
+        file_id = self.connection.execute(
+            'INSERT INTO files (path, mtime_ns, size, fingerprint) VALUES (?, ?, ?, ?)',
+            (path,) + state).lastrowid
+        self.connection.executemany(
+            'INSERT INTO postings (term, file, offsets) VALUES (?, ?, ?)',
+            ((self.term_id(kind, value), file_id, offsets)
+             for (kind, value), offsets in postings.items()))
+
+    def search(self, value, token_type=None):
+        # Where value occurs, as [(path, token_type, offsets)], ordered by path
+        query = ('SELECT files.path, terms.kind, postings.offsets FROM terms'
+                 ' JOIN postings ON postings.term = terms.id'
+                 ' JOIN files ON files.id = postings.file WHERE terms.value = ?')
+        parameters = [value]
+        if token_type is not None:
+            query += ' AND terms.kind = ?'
+            parameters.append(TOKEN_CODES[token_type])
+        return [(path, TOKEN_TYPES[kind], decode_offsets(offsets))
+                for path, kind, offsets in self.connection.execute(
+                    query + ' ORDER BY files.path, terms.kind', parameters)]
+
+    def statistics(self):
+        files, terms, postings, size = self.connection.execute(
+            'SELECT (SELECT COUNT(*) FROM files), (SELECT COUNT(*) FROM terms),'
+            ' (SELECT COUNT(*) FROM postings), (SELECT TOTAL(LENGTH(offsets)) FROM postings)'
+        ).fetchone()
+        return {'files': files, 'terms': terms, 'postings': postings,
+                'posting_bytes': int(size)}
+
+
+def line_columns(path, offsets):
+    # 1-based (line, column) of each offset, for showing search results
+    with open(path, 'r', errors='replace') as file:
+        code = file.read()
+    starts = [0]
+    position = code.find('\n')
+    while position >= 0:
+        starts.append(position + 1)
+        position = code.find('\n', position + 1)
+    lines = [bisect.bisect_right(starts, offset) for offset in offsets]
+    return [(line, offset - starts[line - 1] + 1) for line, offset in zip(lines, offsets)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Index and search tokens in C, C++ and Java trees")
+    parser.add_argument('index', help="index file, created if missing")
+    commands = parser.add_subparsers(dest='command', required=True)
+    update = commands.add_parser('update', help="index new and changed files under root")
+    update.add_argument('root')
+    update.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    search = commands.add_parser('search', help="show where a token value occurs")
+    search.add_argument('value')
+    search.add_argument('--type', choices=sorted(INDEXED_TYPES), help="only tokens of this type")
+    commands.add_parser('stats', help="show the size of the index")
+    args = parser.parse_args()
+
+    index = TokenIndex(args.index)
+    errors = []
+    try:
+        if args.command == 'update':
+            indexed, removed, unchanged = index.update(args.root, args.workers, errors=errors)
+            print('%d indexed, %d removed, %d unchanged' % (indexed, removed, unchanged))
+        elif args.command == 'search':
+            for path, token_type, offsets in index.search(args.value, args.type):
+                for line, column in line_columns(path, offsets):
+                    print('%s:%d:%d: %s' % (path, line, column, token_type))
+        else:
+            for name, value in index.statistics().items():
+                print('%-14s %d' % (name, value))
+    finally:
+        index.close()
+    for error in errors:
+        sys.stderr.write('%s: %s\n' % (parser.prog, error))
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,125 @@
+import csv
+import json
+import struct
+
+from final_no_errors import TOKEN_CODES, TOKEN_TYPES, Token, generate_token_table
+
+# Writers take any iterable of tokens (a list, iter_tokens(), a TokenBuffer) and write
+# as they go, in batches of BATCH_SIZE tokens, instead of building the whole output first
+BATCH_SIZE = 4096
+
+# Binary format: MAGIC, then the tokens of each file in turn. A file starts with a
+# path record when it is labelled: a uint32 byte count, the code b'P' and the UTF-8
+# path. Its tokens follow in blocks of up to BATCH_SIZE, each a uint32 count and a
+# struct code for the block's value length width, followed by columns: one kind code
+# byte per token, one value length per token, and the UTF-8 values back to back.
+# A zero count ends the file's tokens, and the output ends at the end of the file.
+MAGIC = b'LXT2'
+BLOCK = struct.Struct('<Ic')
+PATH = b'P'
+
+
+def batches(tokens):
+    batch = []
+    for token in tokens:
+        batch.append(token)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Each writer takes file_path to label tokens when several files share one output,
+# and header=False to leave out anything that should only appear once
+
+def write_jsonl(tokens, file, file_path=None, header=True):
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    line = '{"type": %s, "value": %s}\n'
+    if file_path is not None:
+        line = '{"file": ' + dumps(file_path).replace('%', '%%') + ', ' + line[1:]
+    for batch in batches(tokens):
+        file.write(''.join(line % (dumps(token.token_type), dumps(token.value))
+                           for token in batch))
+
+
+def write_csv(tokens, file, file_path=None, header=True):
+    writer = csv.writer(file)
+    prefix = () if file_path is None else (file_path,)
+    if header:
+        writer.writerow(('File',) * len(prefix) + ('Token Type', 'Value'))
+    for batch in batches(tokens):
+        writer.writerows(prefix + (token.token_type, token.value) for token in batch)
+
+
+def write_binary(tokens, file, file_path=None, header=True):
+    # file must be opened in binary mode
+    if header:
+        file.write(MAGIC)
+    if file_path is not None:
+        path = file_path.encode('utf-8', 'surrogateescape')
+        file.write(BLOCK.pack(len(path), PATH) + path)
+    for batch in batches(tokens):
+        values = [token.value.encode('utf-8', 'surrogatepass') for token in batch]
+        lengths = list(map(len, values))
+        longest = max(lengths)
+        width = 'B' if longest < 1 << 8 else 'H' if longest < 1 << 16 else 'I'
+        file.write(BLOCK.pack(len(batch), width.encode()))
+        file.write(bytes(TOKEN_CODES[token.token_type] for token in batch))
+        file.write(struct.pack('<%d%s' % (len(lengths), width), *lengths))
+        file.write(b''.join(values))
+    file.write(BLOCK.pack(0, b'B'))
+
+
+def read_binary_files(file):
+    # Yields (file_path, token) for every token written by write_binary(), with
+    # file_path None for unlabelled tokens
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a binary token stream")
+    file_path = None
+    while True:
+        block = file.read(BLOCK.size)
+        if not block:
+            return
+        if len(block) < BLOCK.size:
+            raise ValueError("truncated binary token stream")
+        count, width = BLOCK.unpack(block)
+        if width == PATH:
+            file_path = file.read(count).decode('utf-8', 'surrogateescape')
+            continue
+        if not count:
+            file_path = None  # The next file may be unlabelled
+            continue
+        kinds = file.read(count)
+        lengths = struct.Struct('<%d%s' % (count, width.decode()))
+        lengths = lengths.unpack(file.read(lengths.size))
+        values = file.read(sum(lengths))
+        position = 0
+        for kind, length in zip(kinds, lengths):
+            value = values[position:position + length].decode('utf-8', 'surrogatepass')
+            yield file_path, Token(TOKEN_TYPES[kind], value)
+            position += length
+
+
+def read_binary(file):
+    # The tokens of every file in the output, in order
+    for file_path, token in read_binary_files(file):
+        yield token
+
+
+def write_table(tokens, file, file_path=None, header=True):
+    # The human-readable grid needs every row up front to size its columns
+    from tabulate import tabulate  # Only paid for when a table is asked for
+    if file_path is not None:
+        file.write('%s%s:\n' % ('' if header else '\n', file_path))
+    file.write(tabulate(generate_token_table(tokens), headers=["Token Type", "Value"],
+                        tablefmt="grid"))
+    file.write('\n')
+
+
+WRITERS = {
+    'table': write_table,
+    'jsonl': write_jsonl,
+    'csv': write_csv,
+    'binary': write_binary,
+}